@@ -0,0 +1,144 @@
+import hashlib
+import os
+import struct
+import time
+
+import pygame
+
+# Sprites, loaded the first time they're asked for by name. Each comes from
+# a source image, scaled once and converted to the display's pixel format,
+# so blits don't convert pixels every frame. The scaled pixels are cached
+# on disk, keyed by a hash of the source file and how it's scaled, so the
+# next start skips decoding and scaling. pack() puts every sprite in one
+# atlas surface; the sprites handed out after that are pieces of it.
+
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sII")   # magic, width, height, then RGBA rows
+CACHE_MAGIC = b"FLSP"
+
+
+class AssetManager:
+    def __init__(self, sprites, path="assets", cache_dir=".asset-cache"):
+        # sprites maps names to (file, scale): scale is a (width, height), a
+        # factor, or None for the image as it is
+        self.sprites = sprites
+        self.path = path
+        self.cache_dir = cache_dir
+        self.surfaces = {}
+        self.atlas = None
+        self.load_times = {}    # Name -> ms it took to load
+        self.hits = 0           # Loaded from the disk cache
+        self.misses = 0         # Decoded and scaled
+
+    # Reads like a dict of name -> surface
+    def __getitem__(self, name):
+        return self.load(name)
+
+    def __contains__(self, name):
+        return name in self.sprites
+
+    def __iter__(self):
+        return iter(self.sprites)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def get(self, name, default=None):
+        return self.load(name) if name in self.sprites else default
+
+    def keys(self):
+        return self.sprites.keys()
+
+    def values(self):
+        return [self.load(name) for name in self.sprites]
+
+    def items(self):
+        return [(name, self.load(name)) for name in self.sprites]
+
+    def load(self, name):
+        surface = self.surfaces.get(name)
+        if surface is not None:
+            return surface
+        start = time.perf_counter()
+        file, scale = self.sprites[name]
+        with open(os.path.join(self.path, file), "rb") as f:
+            source = f.read()
+        key = hashlib.sha1(source + repr((scale, CACHE_VERSION)).encode()).hexdigest()
+        cached = os.path.join(self.cache_dir, "%s-%s.rgba" % (name, key))
+
+        surface = self.read_cache(cached)
+        if surface is None:
+            self.misses += 1
+            surface = pygame.image.load(os.path.join(self.path, file))
+            if isinstance(scale, tuple):
+                surface = pygame.transform.scale(surface, scale)
+            elif scale is not None:
+                surface = pygame.transform.scale_by(surface, scale)
+            self.write_cache(cached, surface)
+        else:
+            self.hits += 1
+
+        if pygame.display.get_surface() is not None:   # Converting needs a display
+            surface = surface.convert_alpha()
+        self.surfaces[name] = surface
+        self.load_times[name] = (time.perf_counter() - start) * 1000
+        return surface
+
+    def read_cache(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < CACHE_HEADER.size:     # Cut short, e.g. by a full disk
+            return None
+        magic, width, height = CACHE_HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or len(data) != CACHE_HEADER.size + width * height * 4:
+            return None
+        return pygame.image.frombytes(data[CACHE_HEADER.size:], (width, height), "RGBA")
+
+    def write_cache(self, path, surface):
+        # Best effort: a read-only checkout just never gets a cache
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(CACHE_HEADER.pack(CACHE_MAGIC, *surface.get_size()))
+                f.write(pygame.image.tobytes(surface, "RGBA"))
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    def pack(self, width=1024):
+        # Every sprite into one atlas, in shelves of the tallest first
+        names = sorted(self.sprites, key=lambda name: -self.load(name).get_height())
+        width = max([width] + [self.load(name).get_width() for name in names])
+        places = {}
+        x = y = shelf = 0
+        for name in names:
+            w, h = self.surfaces[name].get_size()
+            if x + w > width:
+                x, y = 0, y + shelf
+                shelf = 0
+            places[name] = pygame.Rect(x, y, w, h)
+            x += w
+            shelf = max(shelf, h)
+        atlas = pygame.Surface((width, max(1, y + shelf)), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+        atlas.fill((0, 0, 0, 0))
+        for name, rect in places.items():
+            # Adding onto the cleared atlas copies pixels as they are, alpha and all
+            atlas.blit(self.surfaces[name], rect, special_flags=pygame.BLEND_RGBA_ADD)
+        for name, rect in places.items():
+            self.surfaces[name] = atlas.subsurface(rect)
+        self.atlas = atlas
+        return atlas
+
+    def stats(self):
+        return {
+            "loaded": len(self.surfaces),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "load_ms": sum(self.load_times.values()),
+            "atlas": self.atlas.get_size() if self.atlas else None,
+        }
@@ -0,0 +1,64 @@
+import math
+
+import pygame
+
+
+class Background:
+    # The map grid, pre-rendered into square chunks that are made the
+    # first time the camera gets near them and thrown away once it's far
+    # off again, so the map size doesn't matter for memory
+    def __init__(self, map_width, map_height, tile_size, view_width, view_height,
+                 chunk_tiles=8, keep=1, color=(255, 255, 255), line_color=(200, 200, 200)):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.tile_size = tile_size
+        self.view_width = view_width
+        self.view_height = view_height
+        self.chunk_size = tile_size * chunk_tiles
+        self.keep = keep            # Chunks kept around the visible ones
+        self.color = color
+        self.line_color = line_color
+        self.chunks = {}
+        self.created = 0
+        self.evicted = 0
+
+    def render_chunk(self, cx, cy):
+        size = self.chunk_size
+        left = cx * size
+        top = cy * size
+        chunk = pygame.Surface((size, size))
+        chunk.fill(self.color)
+        bottom = min(size, self.map_height - top)
+        right = min(size, self.map_width - left)
+        for x in range(0, right, self.tile_size):
+            pygame.draw.line(chunk, self.line_color, (x, 0), (x, bottom))
+        for y in range(0, bottom, self.tile_size):
+            pygame.draw.line(chunk, self.line_color, (0, y), (right, y))
+        self.created += 1
+        return chunk
+
+    def draw(self, surface, camera_x, camera_y):
+        size = self.chunk_size
+        # Lines land on floor(x - camera), same as drawing them at float coordinates
+        camera_x = math.ceil(camera_x)
+        camera_y = math.ceil(camera_y)
+        first_cx = max(0, camera_x // size)
+        first_cy = max(0, camera_y // size)
+        last_cx = min((self.map_width - 1) // size, (camera_x + self.view_width - 1) // size)
+        last_cy = min((self.map_height - 1) // size, (camera_y + self.view_height - 1) // size)
+
+        for cx in range(first_cx, last_cx + 1):
+            for cy in range(first_cy, last_cy + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    chunk = self.render_chunk(cx, cy)
+                    self.chunks[(cx, cy)] = chunk
+                surface.blit(chunk, (cx * size - camera_x, cy * size - camera_y))
+
+        # Forget chunks that have fallen well behind the camera
+        keep = self.keep
+        for key in list(self.chunks):
+            if (key[0] < first_cx - keep or key[0] > last_cx + keep or
+                    key[1] < first_cy - keep or key[1] > last_cy + keep):
+                del self.chunks[key]
+                self.evicted += 1
@@ -0,0 +1,185 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from world import World, Inputs, Petal, make_specs, make_spawner, make_loadout, PETAL_COUNT
+from savefile import Replay
+from profiler import percentile
+
+# Deterministic benchmarks: every scenario builds a seeded World and a
+# scripted input track, then steps it for a fixed number of ticks.
+#
+#   python bench.py                       # every scenario, sim only
+#   python bench.py --render              # sim + render (needs assets/)
+#   python bench.py --save-baseline       # remember the numbers
+#   python bench.py --check               # fail if slower than the baseline
+#   python bench.py game.flrp             # re-run a recorded replay
+
+BASELINE = "bench_baseline.json"
+
+
+def script(*steps):
+    # Steps are (ticks, keys), keys like "w+d" or "space" or "shift" or "".
+    # The track repeats once it runs out.
+    track = []
+    for ticks, keys in steps:
+        held = set(keys.split("+")) if keys else set()
+        inputs = Inputs(up="w" in held, down="s" in held, left="a" in held, right="d" in held,
+                        extend="space" in held, recall="shift" in held)
+        track.extend([inputs] * ticks)
+    return lambda tick: track[tick % len(track)]
+
+
+def scatter_mobs(world, count, angry=False, around=None, spread=600):
+    specs = world.spawner.specs()
+    for _ in range(count):
+        spec = world.random.choice(specs)
+        if around:
+            angle = world.random.random() * 2 * math.pi
+            dist = spec.radius + 100 + world.random.random() * spread
+            x = around[0] + math.cos(angle) * dist
+            y = around[1] + math.sin(angle) * dist
+        else:
+            x = world.random.random() * world.map_width
+            y = world.random.random() * world.map_height
+        mob = world.mobs.spawn(x, y, spec)
+        mob.angry = angry
+
+
+def idle_100(seed, images):
+    world = World(make_spawner(images), make_loadout(images), seed=seed)
+    scatter_mobs(world, 100)
+    world.spawner = None
+    return world, script((1, ""))
+
+
+def swarm_2000(seed, images):
+    world = World(make_spawner(images), make_loadout(images), seed=seed, max_mobs=2000)
+    world.player.health = world.player.max_health = 10**9
+    scatter_mobs(world, 2000, angry=True, around=world.player.pos)
+    return world, script((60, "w"), (60, "d"), (60, "s"), (60, "a"))
+
+
+def petals_shot(seed, images):
+    missile = make_specs(images)[0]["cmissile"]
+    loadout = [Petal(missile, i * (360 // PETAL_COUNT)) for i in range(PETAL_COUNT)]
+    world = World(make_spawner(images), loadout, seed=seed)
+    world.player.health = world.player.max_health = 10**9
+    scatter_mobs(world, 100, around=world.player.pos, spread=300)
+    return world, script((40, "space"), (20, "shift"), (40, "d+space"), (40, "a"))
+
+
+def drops_500(seed, images):
+    world = World(make_spawner(images), make_loadout(images), seed=seed)
+    petals = [spec for mob in world.spawner.specs() for spec in mob.drops]
+    for _ in range(500):
+        drop = world.new_drop(world.random.random() * world.map_width, world.random.random() * world.map_height,
+                              world.random.choice(petals))
+        drop.timer = 10**9
+    return world, script((120, "w+a"), (120, "s+d"), (120, "d"), (120, "a"))
+
+
+SCENARIOS = {
+    "idle_100": idle_100,
+    "swarm_2000": swarm_2000,
+    "petals_shot": petals_shot,
+    "drops_500": drops_500,
+}
+
+
+def run(name, ticks, seed=0, render=False):
+    random.seed(seed)
+    images = {}
+    if render:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        import pygame
+        from render import Renderer, load_images, WHITE
+        pygame.init()
+        screen = pygame.display.set_mode((800, 600))
+        images = load_images()
+        renderer = Renderer(800, 600, images)
+
+    if name.endswith(".flrp"):
+        replay = Replay(name, images)
+        world = replay.world
+        step = lambda tick: replay.step()
+        if world.player is None:
+            render = False      # Recorded on a server, nobody to follow
+    else:
+        world, inputs = SCENARIOS[name](seed, images)
+        step = lambda tick: world.step(inputs(tick))
+
+    times = []
+    for tick in range(ticks):
+        start = time.perf_counter()
+        step(tick)
+        if render:
+            screen.fill(WHITE)
+            renderer.update_camera(world.player.pos)
+            renderer.draw_world(screen, world)
+            renderer.draw_drops(screen, world)
+            pygame.display.flip()
+        times.append((time.perf_counter() - start) * 1000)
+
+    times.sort()
+    return {
+        "ticks_per_sec": len(times) / (sum(times) / 1000),
+        "p50": percentile(times, 50),
+        "p95": percentile(times, 95),
+        "p99": percentile(times, 99),
+        "max": times[-1],
+        "mobs": len(world.mobs),
+        "drops": len(world.drops),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic florr.io clone benchmarks")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help="scenarios or .flrp replays to run (default: all scenarios)")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", action="store_true", help="also draw every tick")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="fail if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown for --check")
+    args = parser.parse_args()
+
+    mode = "render" if args.render else "sim"
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = []
+    print("%-14s %-6s %10s %8s %8s %8s %8s" % ("scenario", "mode", "ticks/s", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for name in args.scenarios:
+        result = run(name, args.ticks, args.seed, args.render)
+        key = name + "/" + mode
+        line = "%-14s %-6s %10.1f %8.2f %8.2f %8.2f %8.2f" % (
+            name, mode, result["ticks_per_sec"], result["p50"], result["p95"], result["p99"], result["max"])
+        if key in baseline:
+            change = result["ticks_per_sec"] / baseline[key]["ticks_per_sec"] - 1
+            line += "  %+.1f%%" % (change * 100)
+            if args.check and change < -args.tolerance:
+                failed.append(key)
+                line += "  REGRESSION"
+        print(line)
+        if args.save_baseline:
+            baseline[key] = result
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+    if failed:
+        print("Slower than baseline:", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import csv
+import random
+import time
+
+import pygame
+
+from world import World, Inputs, make_spawner, MAX_MOBS, INVENTORY_ROWS, INVENTORY_COLS, TICK_RATE
+from hud import Hud, PetalDrag
+from netclient import NetClient
+from profiler import percentile, rss_mb
+
+# Headless players for capacity testing. Each bot holds keys the way a
+# person at the window would (WASD, SPACE to extend and shoot, LSHIFT to
+# recall) and every so often drags a petal between its inventory and
+# loadout with mouse events, through the same PetalDrag as the client.
+#
+#   python bots.py --bots 300 --seconds 60 --csv local.csv
+#   python bots.py --server 127.0.0.1:7000 --bots 300 --csv net.csv
+#
+# Locally, the bots play one World that's stepped here, as fast as it
+# goes or at --rate with --realtime. Against a server they connect with
+# a NetClient; the protocol has no inventory messages, so those bots
+# only press keys. Every --interval seconds there's a row of tick times
+# (local), input latency and bandwidth (server) and memory, printed and
+# written to the CSV, to plot over time.
+
+SLOT_SIZE = 50          # As in the client
+SCREEN_HEIGHT = 600
+FIELDS = ("seconds", "bots", "mobs", "ticks", "tick_p50", "tick_p95", "tick_max",
+          "snapshots", "kb_in", "latency_p50", "latency_p95", "rss_mb")
+
+
+class Bot:
+    # What one bot does: the keys it holds, changed every 0.2-1.7 s, and
+    # now and then a drag from a filled slot to any slot
+    def __init__(self, rng):
+        self.rng = rng
+        self.keys = Inputs()
+        self.next_keys = 0
+        self.next_drag = rng.uniform(2, 10)
+
+    def inputs(self, now):
+        if now >= self.next_keys:
+            rng = self.rng
+            self.keys = Inputs(up=rng.random() < 0.3, down=rng.random() < 0.3,
+                               left=rng.random() < 0.3, right=rng.random() < 0.3,
+                               extend=rng.random() < 0.3, recall=rng.random() < 0.1)
+            self.next_keys = now + 0.2 + rng.random() * 1.5
+        return self.keys
+
+    def drag(self, now, hud, player, screen_height):
+        # Mouse down and up events, if a drag is due
+        if now < self.next_drag:
+            return []
+        rng = self.rng
+        self.next_drag = now + rng.uniform(5, 20)
+        count = len(player.loadout)
+        filled = [hud.inventory_pos(slot) for slot, stack in enumerate(player.inventory) if stack]
+        filled += [hud.loadout_pos(slot, count, screen_height) for slot, petal in enumerate(player.loadout) if petal]
+        if not filled:
+            return []
+        slots = [hud.inventory_pos(slot) for slot in range(len(player.inventory))]
+        slots += [hud.loadout_pos(slot, count, screen_height) for slot in range(count)]
+        return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=rng.choice(filled), button=1),
+                pygame.event.Event(pygame.MOUSEBUTTONUP, pos=rng.choice(slots), button=1)]
+
+
+class Report:
+    def __init__(self, path=None):
+        self.file = open(path, "w", newline="") if path else None
+        self.writer = csv.DictWriter(self.file, FIELDS, restval="") if path else None
+        if self.writer:
+            self.writer.writeheader()
+
+    def row(self, **values):
+        line = "%6.1f s  bots %4d  rss %7.1f MB" % (values["seconds"], values["bots"], values["rss_mb"])
+        if "ticks" in values:
+            line += "  mobs %5d  ticks %5d  tick p50 %6.2f  p95 %6.2f  max %7.2f ms" % (
+                values["mobs"], values["ticks"], values["tick_p50"], values["tick_p95"], values["tick_max"])
+        if "snapshots" in values:
+            line += "  snapshots %6d  in %7.1f KB/s  latency p50 %6.1f  p95 %6.1f ms" % (
+                values["snapshots"], values["kb_in"], values["latency_p50"], values["latency_p95"])
+        print(line)
+        if self.writer:
+            self.writer.writerow(values)
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def run_local(bots, seconds, rate, seed, max_mobs, interval, report, realtime=False):
+    pygame.font.init()      # Hud wants a font, even with nothing drawn
+    hud = Hud(SLOT_SIZE, INVENTORY_ROWS, INVENTORY_COLS)
+    world = World(make_spawner(), seed=seed, max_mobs=max_mobs, local_player=False, respawn=True,
+                  rate=rate)
+    rng = random.Random(seed)
+    players = []
+    for _ in range(bots):
+        player = world.add_player()
+        players.append((player, Bot(random.Random(rng.random())), PetalDrag(hud, world, player, SCREEN_HEIGHT)))
+
+    # Bots go by game time, so a run does the same things however fast
+    # the machine is; only the timings differ
+    per_row = max(1, int(interval * rate))
+    tick_times = []
+    next_tick = time.perf_counter()
+    try:
+        while world.tick < seconds * rate:
+            now = world.tick / rate
+            for player, bot, drag in players:
+                player.inputs = bot.inputs(now)
+                for event in bot.drag(now, hud, player, SCREEN_HEIGHT):
+                    drag.handle(event)
+            start = time.perf_counter()
+            world.step()
+            tick_times.append((time.perf_counter() - start) * 1000)
+
+            if world.tick % per_row == 0:
+                tick_times.sort()
+                report.row(seconds=world.tick / rate, bots=bots, mobs=len(world.mobs), ticks=len(tick_times),
+                           tick_p50=percentile(tick_times, 50), tick_p95=percentile(tick_times, 95),
+                           tick_max=tick_times[-1], rss_mb=rss_mb())
+                tick_times = []
+            if realtime:
+                next_tick += 1 / rate
+                time.sleep(max(0, next_tick - time.perf_counter()))
+    finally:
+        world.close()
+
+
+async def run_server(host, port, bots, seconds, seed, interval, report):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    clients = []
+
+    async def listen(client):
+        while True:
+            await client.receive()
+
+    async def play(i, bot):
+        client = NetClient()
+        await client.connect(host, port)
+        client.hello("bot%d" % i)
+        clients.append(client)
+        listener = asyncio.ensure_future(listen(client))
+        start = loop.time()
+        sent = None
+        try:
+            while loop.time() - start < seconds and not listener.done():
+                now = loop.time() - start
+                inputs = bot.inputs(now)
+                if inputs is not sent:
+                    client.send_inputs(inputs)
+                    sent = inputs
+                await asyncio.sleep(max(0.01, bot.next_keys - now))
+        finally:
+            listener.cancel()
+            client.close()
+
+    tasks = []
+    for i in range(bots):
+        tasks.append(asyncio.ensure_future(play(i, Bot(random.Random(rng.random())))))
+        await asyncio.sleep(0.01)   # Don't hit accept() with everyone at once
+
+    start = last = loop.time()
+    snapshots = received = 0
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(interval)
+        latencies = []
+        for client in clients:
+            latencies.extend(client.latencies)
+            client.latencies.clear()
+        latencies.sort()
+        total = sum(client.snapshots for client in clients)
+        total_bytes = sum(client.bytes_received for client in clients)
+        now = loop.time()
+        report.row(seconds=now - start, bots=sum(not task.done() for task in tasks),
+                   snapshots=round((total - snapshots) / (now - last)),
+                   kb_in=(total_bytes - received) / 1024 / (now - last), latency_p50=percentile(latencies, 50),
+                   latency_p95=percentile(latencies, 95), rss_mb=rss_mb())
+        snapshots, received, last = total, total_bytes, now
+    for task in tasks:
+        if task.exception():
+            print("bot failed:", repr(task.exception()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bots to load the game with")
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--server", help="HOST:PORT of a server.py to play on, instead of a local world")
+    parser.add_argument("--rate", type=int, default=TICK_RATE, help="local ticks per (game) second")
+    parser.add_argument("--realtime", action="store_true", help="step the local world at --rate, not flat out")
+    parser.add_argument("--max-mobs", type=int, default=MAX_MOBS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds per report row")
+    parser.add_argument("--csv", help="also write the report rows to this file")
+    args = parser.parse_args()
+
+    report = Report(args.csv)
+    try:
+        if args.server:
+            host, port = args.server.rsplit(":", 1)
+            asyncio.run(run_server(host, int(port), args.bots, args.seconds, args.seed, args.interval, report))
+        else:
+            run_local(args.bots, args.seconds, args.rate, args.seed, args.max_mobs, args.interval, report,
+                      args.realtime)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        report.close()
+
+
+if __name__ == "__main__":
+    main()
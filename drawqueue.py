@@ -0,0 +1,45 @@
+# Layers, bottom to top
+PLAYERS = 0
+PETALS = 1
+BARS = 2
+MOBS = 3
+DROPS = 4
+LAYERS = 5
+
+
+def _texture(command):
+    return id(command[0])
+
+
+class DrawQueue:
+    # One frame's sprites as (surface, position) commands, by layer. Filling
+    # the queue only reads the world; flush() then hands each layer to
+    # Surface.blits() in one call, sorted by texture so the same sprite is
+    # blitted back to back. A filled queue is just lists of tuples, so it
+    # can be drawn after the world has moved on, or from another thread.
+    def __init__(self, layers=LAYERS):
+        self.layers = [[] for _ in range(layers)]
+        self.commands = 0       # Blitted by flush(), since the last reset()
+        self.calls = 0
+
+    def add(self, layer, surface, pos):
+        self.layers[layer].append((surface, pos))
+
+    def clear(self):
+        for commands in self.layers:
+            commands.clear()
+
+    def flush(self, target, layers=None):
+        for layer in range(len(self.layers)) if layers is None else layers:
+            commands = self.layers[layer]
+            if not commands:
+                continue
+            commands.sort(key=_texture)
+            target.blits(commands, False)
+            self.commands += len(commands)
+            self.calls += 1
+            commands.clear()
+
+    def reset(self):
+        self.commands = 0
+        self.calls = 0
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Combat events. The collision loops in World.update_mobs() only append
+# hits to a HitBuffer; World.resolve_combat() then applies the tick's
+# damage, kills and knockback in one go and publishes the buffers on the
+# EventBus. Listeners (stats, network sync, sound) get whole batches once
+# a tick, so they add nothing to the collision loops.
+
+MOB_HITS = "mob_hits"           # Petals hitting mobs: player, mob, damage, killed
+PLAYER_HITS = "player_hits"     # Mobs running into players: player, mob, damage
+
+
+class HitBuffer:
+    # Columns are preallocated and doubled when full, like MobPool; rows
+    # past count are leftovers. player indexes players, the tick's live
+    # players; mob is a mob row, valid until resolve_combat() compacts
+    # the pool.
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.players = []
+        self.capacity = capacity
+        self.player = np.zeros(capacity, dtype=np.intp)
+        self.mob = np.zeros(capacity, dtype=np.intp)
+        self.mob_id = np.zeros(capacity, dtype=np.int64)   # Filled in when resolved
+        self.damage = np.zeros(capacity)
+        self.killed = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in ("player", "mob", "mob_id", "damage", "killed"):
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, player, mob, damage, killed=False):
+        i = self.count
+        if i == self.capacity:
+            self._grow()
+        self.player[i] = player
+        self.mob[i] = mob
+        self.damage[i] = damage
+        self.killed[i] = killed
+        self.count = i + 1
+
+    def clear(self):
+        self.count = 0
+
+
+class EventBus:
+    # kind -> callbacks, each called with the world and the batch
+    def __init__(self):
+        self.listeners = {}
+
+    def subscribe(self, kind, callback):
+        self.listeners.setdefault(kind, []).append(callback)
+
+    def unsubscribe(self, kind, callback):
+        callbacks = self.listeners.get(kind, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.listeners[kind]
+
+    def publish(self, kind, world, batch):
+        for callback in self.listeners.get(kind, ()):
+            callback(world, batch)
@@ -0,0 +1,193 @@
+import pygame
+
+
+INVENTORY_X, INVENTORY_Y = 20, 20
+LOADOUT_X = 100
+
+
+class Hud:
+    # The inventory and loadout panels, rendered to their own surfaces and
+    # only re-rendered when the slots they show change
+    def __init__(self, slot_size, rows, cols):
+        self.slot_size = slot_size
+        self.rows = rows
+        self.cols = cols
+        self.font = pygame.font.SysFont(None, 24)
+        self.glyphs = {}            # Stack count -> rendered text
+        self.inventory_panel = None
+        self.inventory_key = None
+        self.loadout_panel = None
+        self.loadout_key = None
+        self.rebuilds = 0
+        self.profiler_panel = None
+        self.profiler_age = 0
+
+    def glyph(self, count):
+        text = self.glyphs.get(count)
+        if text is None:
+            text = self.font.render(str(count), True, (0, 0, 0))
+            self.glyphs[count] = text
+        return text
+
+    def draw_slot(self, panel, rect, petal, count=None):
+        if petal:
+            pygame.draw.rect(panel, petal.rarity_color, rect)
+        else:
+            pygame.draw.rect(panel, (255, 255, 255), rect)
+
+        pygame.draw.rect(panel, (0, 0, 0), rect, 2)
+
+        if petal:
+            panel.blit(petal.color, (rect.x + self.slot_size // 2 - petal.color.get_width() // 2,
+                                     rect.y + self.slot_size // 2 - petal.color.get_height() // 2))
+            if count is not None:
+                panel.blit(self.glyph(count), (rect.x + self.slot_size - 10, rect.y + self.slot_size - 10))
+
+    def render_inventory(self, inventory):
+        size = self.slot_size
+        panel = pygame.Surface((self.cols * (size + 5) - 5, self.rows * (size + 5) - 5), pygame.SRCALPHA)
+        for row in range(self.rows):
+            for col in range(self.cols):
+                idx = row * self.cols + col
+                rect = pygame.Rect(col * (size + 5), row * (size + 5), size, size)
+                if inventory[idx]:
+                    self.draw_slot(panel, rect, inventory[idx][0], inventory[idx][1])
+                else:
+                    self.draw_slot(panel, rect, None)
+        return panel
+
+    def render_loadout(self, loadout):
+        size = self.slot_size
+        panel = pygame.Surface((max(1, len(loadout) * (size + 5) - 5), size), pygame.SRCALPHA)
+        for i in range(len(loadout)):
+            self.draw_slot(panel, pygame.Rect(i * (size + 5), 0, size, size), loadout[i])
+        return panel
+
+    def slot_at(self, x, y, cols, rows):
+        # Slot under (x, y), relative to a panel's top left, or None for the
+        # gaps between slots and outside the panel
+        pitch = self.slot_size + 5
+        if x < 0 or y < 0 or x % pitch >= self.slot_size or y % pitch >= self.slot_size:
+            return None
+        col, row = x // pitch, y // pitch
+        if col >= cols or row >= rows:
+            return None
+        return row * cols + col
+
+    def inventory_slot(self, pos):
+        return self.slot_at(pos[0] - INVENTORY_X, pos[1] - INVENTORY_Y, self.cols, self.rows)
+
+    def loadout_slot(self, pos, count, screen_height):
+        return self.slot_at(pos[0] - LOADOUT_X, pos[1] - (screen_height - self.slot_size - 20), count, 1)
+
+    def slot_pos(self, slot, cols, left, top):
+        # Centre of a slot, the other way from slot_at()
+        pitch = self.slot_size + 5
+        return (left + slot % cols * pitch + self.slot_size // 2, top + slot // cols * pitch + self.slot_size // 2)
+
+    def inventory_pos(self, slot):
+        return self.slot_pos(slot, self.cols, INVENTORY_X, INVENTORY_Y)
+
+    def loadout_pos(self, slot, count, screen_height):
+        return self.slot_pos(slot, count, LOADOUT_X, screen_height - self.slot_size - 20)
+
+    def draw_inventory(self, screen, inventory):
+        key = (inventory, inventory.version)
+        if key != self.inventory_key:
+            self.inventory_panel = self.render_inventory(inventory)
+            self.inventory_key = key
+            self.rebuilds += 1
+        screen.blit(self.inventory_panel, (INVENTORY_X, INVENTORY_Y))
+
+    def draw_loadout(self, screen, loadout):
+        # By spec: pooled petals come back from unequip() with a new one
+        key = tuple(petal and petal.spec for petal in loadout)
+        if key != self.loadout_key:
+            self.loadout_panel = self.render_loadout(loadout)
+            self.loadout_key = key
+            self.rebuilds += 1
+        screen.blit(self.loadout_panel, (LOADOUT_X, screen.get_height() - self.slot_size - 20))
+
+    def draw_profiler(self, screen, profiler, counters, refresh=30):
+        # Percentiles only change slowly, so the text is re-rendered every
+        # refresh frames rather than every frame
+        self.profiler_age -= 1
+        if self.profiler_panel is None or self.profiler_age <= 0:
+            lines = ["phase       p50    p95    p99 (ms)"]
+            for name in profiler.phases:
+                p50, p95, p99 = profiler.percentiles(name)
+                lines.append("%-10s %5.2f  %5.2f  %5.2f" % (name, p50, p95, p99))
+            for name in counters:
+                lines.append("%-10s %s" % (name, round(profiler.latest(name), 1)))
+            if profiler.recording:
+                lines.append("recording %d frames" % len(profiler.trace))
+
+            height = 18 * len(lines) + 8
+            panel = pygame.Surface((300, height), pygame.SRCALPHA)
+            panel.fill((0, 0, 0, 160))
+            for i, line in enumerate(lines):
+                panel.blit(self.font.render(line, True, (255, 255, 255)), (6, 4 + 18 * i))
+            self.profiler_panel = panel
+            self.profiler_age = refresh
+        screen.blit(self.profiler_panel, (screen.get_width() - self.profiler_panel.get_width() - 10, 10))
+
+
+class PetalDrag:
+    # Dragging petals between a player's inventory and loadout with the
+    # mouse. Takes pygame mouse events, from the window or made up by a bot.
+    def __init__(self, hud, world, player, screen_height):
+        self.hud = hud
+        self.world = world
+        self.player = player
+        self.screen_height = screen_height
+        self.item = None        # Spec of the petal being dragged
+        self.source = None      # ("inventory" or "loadout", slot) it came from
+
+    def handle(self, event):
+        hud, world, player = self.hud, self.world, self.player
+        inventory, loadout = player.inventory, player.loadout
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            # Check inventory slots
+            idx = hud.inventory_slot(event.pos)
+            if idx is not None and inventory[idx]:
+                self.item = inventory.take(idx)
+                self.source = ("inventory", idx)
+
+            # Check loadout slots
+            i = hud.loadout_slot(event.pos, len(loadout), self.screen_height)
+            if i is not None and loadout[i]:
+                self.item = loadout[i].spec
+                self.source = ("loadout", i)
+                world.unequip(player, i)
+
+        elif event.type == pygame.MOUSEBUTTONUP and self.item:
+            placed = False
+
+            # Drop into inventory, on an empty slot or a stack of the same kind
+            idx = hud.inventory_slot(event.pos)
+            if idx is not None:
+                placed = inventory.put(idx, self.item)
+
+            # Drop into loadout
+            i = hud.loadout_slot(event.pos, len(loadout), self.screen_height)
+            if i is not None and not loadout[i]:
+                world.equip(player, i, self.item)
+                placed = True
+
+            if not placed:
+                self.cancel()
+            self.item = None
+            self.source = None
+
+    def cancel(self):
+        # Back to where it came from
+        if not self.item:
+            return
+        if self.source[0] == "inventory":
+            # Unless a pickup took the slot meanwhile
+            if not self.player.inventory.put(self.source[1], self.item):
+                self.player.inventory.add(self.item)
+        else:
+            self.world.equip(self.player, self.source[1], self.item)
+        self.item = None
+        self.source = None
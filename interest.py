@@ -0,0 +1,176 @@
+import math
+
+import numpy as np
+
+from world import camera_origin
+from netproto import EntityEncoder, entity_key, KIND_PLAYER, KIND_MOB, KIND_DROP
+
+# Area of interest: which entities each player gets told about.
+#
+# A player's view is the camera rect Renderer.update_camera() would show
+# it. An entity comes into view once it is within enter_margin of that
+# rect and only goes out again past leave_margin, so mobs wandering along
+# the edge don't flicker in and out every other tick.
+#
+# Every entity is serialized once per tick, in begin_tick(): the mobs all
+# at once into one RECORD array, players and drops one by one. Views then
+# only pick rows out of that. Entities are also bucketed into a grid of
+# sorted arrays, so a view only looks at the few cells around it.
+
+
+class View:
+    # One player's interest: keys of what it was last told is in view
+    # (sorted), and the tick it was last told
+    __slots__ = ("player", "keys", "tick")
+
+    def __init__(self, player):
+        self.player = player
+        self.keys = np.empty(0, dtype=np.int64)
+        self.tick = -1
+
+
+class InterestManager:
+    def __init__(self, world, view_width, view_height, enter_margin=100, leave_margin=200, cell_size=256):
+        self.world = world
+        self.view_width = view_width
+        self.view_height = view_height
+        self.enter_margin = enter_margin
+        self.leave_margin = leave_margin
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil(world.map_width / cell_size))
+        self.rows = max(1, math.ceil(world.map_height / cell_size))
+        self.encoder = EntityEncoder()
+
+        # Rebuilt by begin_tick(). Entity i is mob i for i < mob_count,
+        # then the players, then the drops.
+        self.mob_count = 0
+        self.mob_records = None     # RECORD array, one row per mob
+        self.other_records = []     # Record bytes for the players and drops
+        self.xs = self.ys = self.keys = None
+        self.stamps = None          # Tick each entity's record last changed
+        self.order = self.starts = None
+
+        # Last tick's mob ids, records and stamps, sorted by id, to tell what changed
+        self.mob_ids = np.empty(0, dtype=np.int64)
+        self.last_records = None
+        self.mob_stamps = np.empty(0, dtype=np.int64)
+        self.last_other = {}        # Entity key -> (record bytes, stamp)
+        self.encoded = 0
+
+    def begin_tick(self):
+        world = self.world
+        tick = world.tick
+        mobs = world.mobs
+        n = len(mobs)
+        players = [player for player in world.players if not player.dead]
+        drops = world.drops
+        self.mob_count = n
+
+        # Mobs: compare with last tick's rows by id. Rows move around as
+        # mobs die, so last tick's are kept sorted by id to search them.
+        records = self.encoder.mobs(mobs)
+        ids = mobs.id[:n].copy()
+        if len(self.mob_ids):
+            pos = np.minimum(np.searchsorted(self.mob_ids, ids), len(self.mob_ids) - 1)
+            same = (self.mob_ids[pos] == ids) & (self.last_records[pos] == records)
+            mob_stamps = np.where(same, self.mob_stamps[pos], tick)
+        else:
+            mob_stamps = np.full(n, tick, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        self.mob_records = records
+        self.mob_ids = ids[order]
+        self.last_records = records[order]
+        self.mob_stamps = mob_stamps[order]
+
+        # Players and drops: few enough to do one at a time
+        other_keys = []
+        other_records = []
+        other_stamps = []
+        last_other = self.last_other
+        other = {}
+        for kind, objs in ((KIND_PLAYER, players), (KIND_DROP, drops)):
+            encode = self.encoder.player if kind == KIND_PLAYER else self.encoder.drop
+            for obj in objs:
+                key = entity_key(kind, obj.id)
+                record = encode(obj)
+                last = last_other.get(key)
+                stamp = last[1] if last is not None and last[0] == record else tick
+                other[key] = (record, stamp)
+                other_keys.append(key)
+                other_records.append(record)
+                other_stamps.append(stamp)
+        self.last_other = other
+        self.other_records = other_records
+        self.encoded += n + len(other_records)
+
+        self.xs = np.concatenate((mobs.x[:n], [player.pos[0] for player in players], [drop.x for drop in drops]))
+        self.ys = np.concatenate((mobs.y[:n], [player.pos[1] for player in players], [drop.y for drop in drops]))
+        self.keys = np.concatenate((entity_key(KIND_MOB, ids), np.array(other_keys, dtype=np.int64)))
+        self.stamps = np.concatenate((mob_stamps, np.array(other_stamps, dtype=np.int64)))
+
+        # Entity indices sorted by cell, and where each cell's run starts
+        cx = np.clip((self.xs // self.cell_size).astype(np.int64), 0, self.cols - 1)
+        cy = np.clip((self.ys // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        cells = cy * self.cols + cx
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.rows * self.cols + 1))
+
+    def query(self, left, top, right, bottom):
+        # Indices of every entity in the cells the rect touches
+        size = self.cell_size
+        cx0 = min(max(0, int(left // size)), self.cols - 1)
+        cx1 = min(max(0, int(right // size)), self.cols - 1)
+        cy0 = min(max(0, int(top // size)), self.rows - 1)
+        cy1 = min(max(0, int(bottom // size)), self.rows - 1)
+        starts = self.starts
+        runs = [self.order[starts[row * self.cols + cx0]:starts[row * self.cols + cx1 + 1]]
+                for row in range(cy0, cy1 + 1)]
+        return np.concatenate(runs)
+
+    def update(self, view):
+        # Works out what changed for view since it was last updated. Returns
+        # (entered, updated, left): indices of entities that came into view,
+        # indices of ones still in view whose record changed, and keys of
+        # ones that went out of view.
+        world = self.world
+        camera_x, camera_y = camera_origin(view.player.pos, self.view_width, self.view_height,
+                                           world.map_width, world.map_height)
+        right = camera_x + self.view_width
+        bottom = camera_y + self.view_height
+        leave, enter = self.leave_margin, self.enter_margin
+
+        idx = self.query(camera_x - leave, camera_y - leave, right + leave, bottom + leave)
+        xs, ys = self.xs[idx], self.ys[idx]
+        inside = (xs > camera_x - leave) & (xs < right + leave) & (ys > camera_y - leave) & (ys < bottom + leave)
+        idx, xs, ys = idx[inside], xs[inside], ys[inside]
+        near = (xs > camera_x - enter) & (xs < right + enter) & (ys > camera_y - enter) & (ys < bottom + enter)
+
+        keys = self.keys[idx]
+        old = view.keys
+        if len(old):
+            was = old[np.minimum(np.searchsorted(old, keys), len(old) - 1)] == keys
+        else:
+            was = np.zeros(len(keys), dtype=bool)
+        # Between the margins only stays in view if it already was
+        visible = near | was
+        idx, keys, was = idx[visible], keys[visible], was[visible]
+
+        entered = idx[~was]
+        stayed = idx[was]
+        updated = stayed[self.stamps[stayed] > view.tick]
+        keys = np.sort(keys)
+        if len(keys):
+            left = old[keys[np.minimum(np.searchsorted(keys, old), len(keys) - 1)] != old]
+        else:
+            left = old
+        view.keys = keys
+        view.tick = world.tick
+        return entered, updated, left
+
+    def serialize(self, idx):
+        # The records of entities idx, back to back
+        n = self.mob_count
+        other = self.other_records
+        parts = [self.mob_records[idx[idx < n]].tobytes()]
+        parts.extend(other[i - n] for i in idx[idx >= n].tolist())
+        return b"".join(parts)
@@ -0,0 +1,81 @@
+import bisect
+import heapq
+
+
+def kind(spec):
+    # Petals stack with the same name and rarity
+    return (spec.name, spec.rarity_color)
+
+
+class Inventory:
+    # Slots of (spec, count) stacks or None. Which slots hold each kind of
+    # petal is kept in a dict and the empty slots in a heap, so adding a
+    # petal never has to scan the slots.
+    def __init__(self, size):
+        self.slots = [None] * size
+        self.kinds = {}             # kind() -> slots holding it, lowest first
+        self.free = list(range(size))   # Heap of empty slots. May still hold slots
+                                        # that got filled since; find() skips those.
+        self.queued = set(self.free)    # Slots in the heap, each at most once
+        self.version = 0            # Goes up on every change
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __getitem__(self, slot):
+        return self.slots[slot]
+
+    def __setitem__(self, slot, stack):
+        old = self.slots[slot]
+        if old == stack:
+            return
+        if old:
+            slots = self.kinds[kind(old[0])]
+            slots.remove(slot)
+            if not slots:
+                del self.kinds[kind(old[0])]
+        if stack:
+            bisect.insort(self.kinds.setdefault(kind(stack[0]), []), slot)
+        elif slot not in self.queued:
+            heapq.heappush(self.free, slot)
+            self.queued.add(slot)
+        self.slots[slot] = stack
+        self.version += 1
+
+    def find(self, spec):
+        # Where a petal of kind spec goes: onto its stack, else the first
+        # empty slot. None if the inventory is full.
+        slots = self.kinds.get(kind(spec))
+        if slots:
+            return slots[0]
+        free = self.free
+        while free and self.slots[free[0]] is not None:
+            self.queued.discard(heapq.heappop(free))
+        return free[0] if free else None
+
+    def add(self, spec, count=1):
+        # Returns the slot it went in, None if there was no room
+        slot = self.find(spec)
+        if slot is not None:
+            stack = self.slots[slot]
+            self[slot] = (stack[0], stack[1] + count) if stack else (spec, count)
+        return slot
+
+    def put(self, slot, spec):
+        # One petal into slot, if it's empty or holds the same kind
+        stack = self.slots[slot]
+        if stack and kind(stack[0]) != kind(spec):
+            return False
+        self[slot] = (stack[0], stack[1] + 1) if stack else (spec, 1)
+        return True
+
+    def take(self, slot):
+        # One petal off the stack in slot, None if it's empty
+        stack = self.slots[slot]
+        if not stack:
+            return None
+        self[slot] = (stack[0], stack[1] - 1) if stack[1] > 1 else None
+        return stack[0]
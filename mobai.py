@@ -0,0 +1,56 @@
+import numpy as np
+
+# Level of detail for mob AI. Every tick each mob goes in one of three
+# tiers, by how far it is from the nearest player:
+#
+#   near     within active_radius, or angry: moves and steers every tick
+#   far      within awake_radius: moves every tick, but only changes
+#            course every think_every ticks, staggered by id so the
+#            thinking is spread evenly over the ticks
+#   dormant  further out: doesn't move or collide at all until a player
+#            comes close again
+#
+# The tiers come from two coarse grids with the cells around each player
+# marked, so sorting mobs is one lookup each rather than a distance to
+# every player. Distances are boxes, rounded out to whole cells.
+
+
+class MobAI:
+    def __init__(self, map_width, map_height, active_radius=1000, awake_radius=2000,
+                 think_every=4, cell_size=250, scale=1):
+        self.active_radius = active_radius
+        self.awake_radius = awake_radius
+        self.think_every = max(1, round(think_every / scale))      # In ticks of TICK_RATE
+        self.cell_size = cell_size
+        shape = (int(map_height // cell_size) + 1, int(map_width // cell_size) + 1)
+        self.active = np.zeros(shape, dtype=bool)
+        self.awake = np.zeros(shape, dtype=bool)
+        self.near = self.far = self.dormant = 0     # Mobs in each tier last tick
+
+    def mark(self, cells, players, radius):
+        cells.fill(False)
+        size = self.cell_size
+        for player in players:
+            px, py = player.pos
+            cells[max(0, int((py - radius) // size)):int((py + radius) // size) + 1,
+                  max(0, int((px - radius) // size)):int((px + radius) // size) + 1] = True
+
+    def plan(self, mobs, players, tick):
+        # Rows of the mobs that move this tick, and a flag per row for
+        # whether it steers. None for either means every mob.
+        n = len(mobs)
+        self.mark(self.active, players, self.active_radius)
+        self.mark(self.awake, players, self.awake_radius)
+        rows, cols = self.active.shape
+        cx = np.clip(mobs.x[:n] // self.cell_size, 0, cols - 1).astype(np.intp)
+        cy = np.clip(mobs.y[:n] // self.cell_size, 0, rows - 1).astype(np.intp)
+        angry = mobs.angry[:n]
+        near = self.active[cy, cx] | angry
+        awake = self.awake[cy, cx] | angry
+
+        moving = np.flatnonzero(awake)
+        think = near[moving] | ((mobs.id[moving] + tick) % self.think_every == 0)
+        self.near = int(np.count_nonzero(near))
+        self.far = len(moving) - self.near
+        self.dormant = n - len(moving)
+        return (None if len(moving) == n else moving), (None if think.all() else think)
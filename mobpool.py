@@ -0,0 +1,347 @@
+import math
+
+import numpy as np
+
+BOUNCE = 0.5        # Speed each of two overlapping mobs gets pushed apart by, per tick
+
+
+def _field(name):
+    def get(self):
+        return getattr(self.pool, name)[self.index].item()
+
+    def set(self, value):
+        getattr(self.pool, name)[self.index] = value
+
+    return property(get, set)
+
+
+class Mob:
+    # Thin view of one row of a MobPool. What kind of mob it is (texture,
+    # drop table) comes from its MobSpec.
+    __slots__ = ("pool", "index", "spec")
+
+    x = _field("x")
+    y = _field("y")
+    dx = _field("dx")
+    dy = _field("dy")
+    speed = _field("speed")
+    radius = _field("radius")
+    health = _field("health")
+    damage = _field("damage")
+    angry = _field("angry")
+    id = _field("id")
+
+    def __init__(self, pool, index, spec):
+        self.pool = pool
+        self.index = index
+        self.spec = spec
+
+    @property
+    def texture(self):
+        return self.spec.texture
+
+    @property
+    def drops(self):
+        return self.spec.drops
+
+
+class MobPool:
+    FIELDS = ("x", "y", "dx", "dy", "speed", "radius", "health", "damage")
+    COLUMNS = FIELDS + ("angry", "id", "idle")
+
+    def __init__(self, map_width, map_height, capacity=128, seed=None, scale=1):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.scale = scale      # The World's, as speeds are per tick
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.next_id = 1        # Ids stay with a mob while rows get compacted
+        self.mobs = []          # Views, row i of the arrays is self.mobs[i]
+        self.free_views = []    # Views of dead mobs, handed out again by spawn()
+        self.capacity = capacity
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(capacity))
+        self.angry = np.zeros(capacity, dtype=bool)
+        self.id = np.zeros(capacity, dtype=np.int64)
+        self.idle = np.zeros(capacity, dtype=np.int64)     # Ticks spent far from every player
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.mobs)
+
+    def __getitem__(self, i):
+        return self.mobs[i]
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, x, y, spec):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.dx[i] = 0
+        self.dy[i] = 0
+        self.speed[i] = spec.speed * self.scale
+        self.radius[i] = spec.radius
+        self.health[i] = spec.health
+        self.damage[i] = spec.damage
+        self.angry[i] = False
+        self.idle[i] = 0
+        self.id[i] = self.next_id
+        self.next_id += 1
+        if self.free_views:
+            mob = self.free_views.pop()
+            mob.index = i
+            mob.spec = spec
+        else:
+            mob = Mob(self, i, spec)
+        self.mobs.append(mob)
+        self.count += 1
+        return mob
+
+    def adopt(self, columns, specs, next_id):
+        # Take over ready-made rows, e.g. arrays backed by a mapped save
+        # file, instead of copying them in. Row i is of kind specs[i].
+        n = len(specs)
+        self.next_id = next_id
+        if n == 0:
+            return
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.count = self.capacity = n
+        self.mobs = [Mob(self, i, spec) for i, spec in enumerate(specs)]
+        self.free_views = []
+
+    def swap_remove(self, rows):
+        # Each row gets the last mob moved into it, so removing k mobs is
+        # O(k) however many there are. Moves mobs to other rows: stale
+        # row numbers must not be used afterwards.
+        columns = [getattr(self, name) for name in self.COLUMNS]
+        mobs = self.mobs
+        for row in sorted(rows.tolist(), reverse=True):
+            last = self.count - 1
+            self.free_views.append(mobs[row])
+            if row != last:
+                for arr in columns:
+                    arr[row] = arr[last]
+                mob = mobs[row] = mobs[last]
+                mob.index = row
+            mobs.pop()
+            self.count = last
+
+    def remove(self, alive):
+        # Stable compaction, keeping the mobs where alive is set
+        if alive.all():
+            return
+        n = self.count
+        for name in self.COLUMNS:
+            arr = getattr(self, name)
+            kept = arr[:n][alive]
+            arr[:len(kept)] = kept
+        mobs = []
+        for mob, keep in zip(self.mobs, alive.tolist()):
+            if keep:
+                mob.index = len(mobs)
+                mobs.append(mob)
+            else:
+                self.free_views.append(mob)
+        self.mobs = mobs
+        self.count = len(mobs)
+
+    def update(self, positions, rows=None, think=None):
+        # Move the mobs, or just rows of them, and steer them: angry mobs
+        # toward the nearest of positions, the rest at random. think has a
+        # flag per moving mob for whether it steers this tick; None is all.
+        if rows is None:
+            n = self.count
+            x, y = self.x[:n], self.y[:n]
+            dx, dy = self.dx[:n], self.dy[:n]
+            speed, radius, angry = self.speed[:n], self.radius[:n], self.angry[:n]
+        else:
+            x, y = self.x[rows], self.y[rows]
+            dx, dy = self.dx[rows], self.dy[rows]
+            speed, radius, angry = self.speed[rows], self.radius[rows], self.angry[rows]
+
+        x += dx
+        y += dy
+        np.minimum(np.maximum(dx, -speed), speed, out=dx)
+        np.minimum(np.maximum(dy, -speed), speed, out=dy)
+
+        # Bounce off the walls
+        hit = x < radius
+        x[hit] = radius[hit]
+        dx[hit] *= -1
+        hit = x > self.map_width - radius
+        x[hit] = self.map_width - radius[hit]
+        dx[hit] *= -1
+        hit = y < radius
+        y[hit] = radius[hit]
+        dy[hit] *= -1
+        hit = y > self.map_height - radius
+        y[hit] = self.map_height - radius[hit]
+        dy[hit] *= -1
+
+        # Noise is drawn for every moving mob so the stream matches
+        # update_scalar(). Angry mobs with nobody to chase stand still.
+        noise = self.rng.random((len(x), 2))
+        # speed is per tick already, and steering changes it per tick, so
+        # it scales again
+        steer_x = (noise[:, 0] - 0.5) * speed / 10 * self.scale
+        steer_y = (noise[:, 1] - 0.5) * speed / 10 * self.scale
+        steer_x[angry] = 0
+        steer_y[angry] = 0
+        chasing = np.flatnonzero(angry if think is None else angry & think)
+        if positions and len(chasing):
+            # All the chasers of a player share its position, so this is
+            # one pass over them, not a path per mob
+            cx, cy = x[chasing], y[chasing]
+            to_x, to_y = nearest(positions, cx, cy)
+            to_x = to_x - cx
+            to_y = to_y - cy
+            dist = np.maximum(1, np.sqrt(to_x * to_x + to_y * to_y))  # Avoid division by 0
+            steer_x[chasing] = to_x / dist * speed[chasing] / 10 * self.scale
+            steer_y[chasing] = to_y / dist * speed[chasing] / 10 * self.scale
+        if think is not None:
+            steer_x[~think] = 0
+            steer_y[~think] = 0
+        dx += steer_x
+        dy += steer_y
+
+        if rows is not None:
+            self.x[rows] = x
+            self.y[rows] = y
+            self.dx[rows] = dx
+            self.dy[rows] = dy
+
+    def update_scalar(self, positions):
+        # Reference version of update() for every mob, one at a time
+        for i in range(self.count):
+            x = self.x[i].item() + self.dx[i].item()
+            y = self.y[i].item() + self.dy[i].item()
+            speed = self.speed[i].item()
+            radius = self.radius[i].item()
+            dx = min(max(self.dx[i].item(), -speed), speed)
+            dy = min(max(self.dy[i].item(), -speed), speed)
+
+            if x < radius:
+                x = radius
+                dx *= -1
+            if x > self.map_width - radius:
+                x = self.map_width - radius
+                dx *= -1
+            if y < radius:
+                y = radius
+                dy *= -1
+            if y > self.map_height - radius:
+                y = self.map_height - radius
+                dy *= -1
+
+            noise = self.rng.random(2)
+            if self.angry[i]:
+                # Move toward the nearest player, if there is one
+                if positions:
+                    target = min(positions, key=lambda pos: (x - pos[0]) ** 2 + (y - pos[1]) ** 2)
+                    to_x = target[0] - x
+                    to_y = target[1] - y
+                    dist = max(1, math.sqrt(to_x * to_x + to_y * to_y))  # Avoid division by 0
+                    dx += to_x / dist * speed / 10 * self.scale
+                    dy += to_y / dist * speed / 10 * self.scale
+            else:
+                # Move randomly
+                dx += (noise[0].item() - 0.5) * speed / 10 * self.scale
+                dy += (noise[1].item() - 0.5) * speed / 10 * self.scale
+
+            self.x[i] = x
+            self.y[i] = y
+            self.dx[i] = dx
+            self.dy[i] = dy
+
+    def visible_rows(self, left, top, right, bottom, margin):
+        # Rows of mobs whose centre is within margin of the rect
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        inside = (x > left - margin) & (x < right + margin) & (y > top - margin) & (y < bottom + margin)
+        return np.flatnonzero(inside)
+
+    def build_grid(self, grid, idx=None):
+        # Every mob, or just rows idx (ascending)
+        n = self.count
+        if idx is None:
+            grid.build(self.mobs, self.x[:n].tolist(), self.y[:n].tolist(), self.radius[:n].tolist())
+        else:
+            mobs = self.mobs
+            grid.build([mobs[i] for i in idx.tolist()], self.x[idx].tolist(), self.y[idx].tolist(),
+                       self.radius[idx].tolist())
+
+    def bounce(self):
+        # BOUNCE, scaled like steering: a change of a per-tick speed, per tick
+        return BOUNCE * self.scale * self.scale
+
+    def separate(self, pairs, rows=None):
+        # Push overlapping mobs apart, pairs in the order the grid gives them.
+        # With rows, the pairs index into rows, as from build_grid(grid, rows).
+        if rows is None:
+            rows = slice(0, self.count)
+        xs, ys = self.x[rows].tolist(), self.y[rows].tolist()
+        dxs, dys = self.dx[rows].tolist(), self.dy[rows].tolist()
+        separate(xs, ys, dxs, dys, self.radius[rows].tolist(), pairs, self.bounce())
+        self.x[rows] = xs
+        self.y[rows] = ys
+        self.dx[rows] = dxs
+        self.dy[rows] = dys
+
+
+def separate(xs, ys, dxs, dys, radii, pairs, bounce=BOUNCE):
+    # MobPool.separate() on plain lists, in place. Each push moves mobs
+    # that later pairs look at, so this is a loop, not array maths. Most
+    # pairs from the grid don't touch, and are let go on one coordinate
+    # before hypot().
+    hypot = math.hypot
+    for i, j in pairs:
+        reach = radii[i] + radii[j]
+        dx = xs[j] - xs[i]
+        if dx >= reach or dx <= -reach:
+            continue
+        dy = ys[j] - ys[i]
+        if dy >= reach or dy <= -reach:
+            continue
+        dist = hypot(dx, dy)
+
+        if dist < reach and dist > 0:
+            # How much overlap there is
+            overlap = reach - dist
+
+            # Normalize direction vector
+            nx = dx / dist
+            ny = dy / dist
+
+            # Push each mob away from the other
+            xs[i] -= nx * overlap / 2
+            ys[i] -= ny * overlap / 2
+            xs[j] += nx * overlap / 2
+            ys[j] += ny * overlap / 2
+
+            # Optional: add a little bounce to their velocities
+            dxs[i] -= nx * bounce
+            dys[i] -= ny * bounce
+            dxs[j] += nx * bounce
+            dys[j] += ny * bounce
+
+
+def nearest(positions, x, y):
+    # The closest of positions to each point, as (xs, ys) or one position
+    if len(positions) == 1:
+        return positions[0]
+    px = np.array([pos[0] for pos in positions], dtype=float)
+    py = np.array([pos[1] for pos in positions], dtype=float)
+    closest = ((x[:, None] - px) ** 2 + (y[:, None] - py) ** 2).argmin(axis=1)
+    return px[closest], py[closest]
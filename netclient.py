@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from netproto import (SnapshotDecoder, read_message, frame, pack_inputs, VERSION,
+                      MSG_WELCOME, MSG_SNAPSHOT, MSG_INPUT, MSG_HELLO, WELCOME, INPUT, HELLO)
+
+# Client end of server.py. bots.py uses it to load-test a server:
+#
+#   python bots.py --server 127.0.0.1:7000 --bots 200 --seconds 30
+
+
+class NetClient:
+    def __init__(self, images={}):
+        self.decoder = SnapshotDecoder(images)
+        self.reader = None
+        self.writer = None
+        self.player_id = 0
+        self.rate = 0
+        self.input_seq = 0
+        self.pending = {}       # Input sequence -> when it was sent
+        self.latencies = []     # Input sent -> snapshot that includes it, ms
+        self.snapshots = 0
+        self.bytes_received = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        body = await read_message(self.reader)
+        _, version, self.player_id, self.rate, map_width, map_height = WELCOME.unpack(body)
+        if body[0] != MSG_WELCOME or version != VERSION:
+            raise ConnectionError("server speaks protocol %d, we speak %d" % (version, VERSION))
+
+    def hello(self, name):
+        # Play as the named profile, on servers that keep them
+        self.writer.write(frame(HELLO.pack(MSG_HELLO) + name.encode()))
+
+    def send_inputs(self, inputs):
+        self.input_seq += 1
+        self.pending[self.input_seq] = time.perf_counter()
+        self.writer.write(frame(INPUT.pack(MSG_INPUT, self.input_seq, pack_inputs(inputs))))
+
+    async def receive(self):
+        body = await read_message(self.reader)
+        self.bytes_received += len(body) + 4
+        if body[0] == MSG_SNAPSHOT:
+            self.decoder.apply(body)
+            self.snapshots += 1
+            acked = self.decoder.last_input
+            if acked in self.pending:
+                now = time.perf_counter()
+                for seq in [seq for seq in self.pending if seq <= acked]:
+                    self.latencies.append((now - self.pending.pop(seq)) * 1000)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
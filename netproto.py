@@ -0,0 +1,196 @@
+import math
+import struct
+
+import numpy as np
+
+from world import Inputs, make_specs
+
+# Wire format shared by server.py and netclient.py. Every message is a
+# little-endian u32 length followed by a body whose first byte is its type.
+#
+#   WELCOME   server -> client once, after connecting
+#   HELLO     client -> server, optional, first: the profile to play as
+#   INPUT     client -> server, whenever the held keys change
+#   SNAPSHOT  server -> client every tick: the entities that came into the
+#             client's view or changed since the last snapshot it was sent,
+#             plus the ones that went out of it (see interest.py)
+
+VERSION = 1
+
+MSG_WELCOME = 0
+MSG_INPUT = 1
+MSG_SNAPSHOT = 2
+MSG_HELLO = 3
+
+KIND_PLAYER = 0
+KIND_MOB = 1
+KIND_DROP = 2
+
+FRAME = struct.Struct("<I")
+WELCOME = struct.Struct("<BBIHHH")      # type, version, player id, tick rate, map width, map height
+INPUT = struct.Struct("<BIB")           # type, input sequence, key bits
+HELLO = struct.Struct("<B")             # type, then the profile name in UTF-8
+SNAPSHOT = struct.Struct("<BIIHH")      # type, tick, last input sequence seen, removed count, record count
+REMOVED = struct.Struct("<BI")          # kind, id
+RECORD = struct.Struct("<BIBHHBB")      # kind, id, spec, x, y, heading, health
+PETAL = struct.Struct("<BBHH")          # spec, state, x, y (players only, after a u8 count)
+
+# The same layouts as numpy dtypes, to write many at once
+REMOVED_DTYPE = np.dtype([("kind", "u1"), ("id", "<u4")])
+RECORD_DTYPE = np.dtype([("kind", "u1"), ("id", "<u4"), ("spec", "u1"), ("x", "<u2"), ("y", "<u2"),
+                         ("heading", "u1"), ("health", "u1")])
+
+PETAL_STATES = ("orbiting", "shot", "reloading")
+KEYS = ("up", "down", "left", "right", "extend", "recall")
+
+POSITION_SCALE = 4                      # Positions go out in quarter pixels
+
+
+def pack_inputs(inputs):
+    bits = 0
+    for i, key in enumerate(KEYS):
+        if getattr(inputs, key):
+            bits |= 1 << i
+    return bits
+
+
+def unpack_inputs(bits):
+    return Inputs(*[bool(bits & (1 << i)) for i in range(len(KEYS))])
+
+
+def spec_tables(images={}):
+    # Both ends number specs by their order in make_specs(). Specs are looked
+    # up by value, since every make_specs() call builds new objects.
+    petals, mobs = make_specs(images)
+    return list(petals.values()), list(mobs.values())
+
+
+def petal_key(spec):
+    return (spec.name, spec.rarity_color)
+
+
+def mob_key(spec):
+    return (spec.name, spec.radius)
+
+
+def quantize(value):
+    return max(0, min(0xFFFF, int(value * POSITION_SCALE)))
+
+
+def heading(dx, dy):
+    return int(math.atan2(dy, dx) / (2 * math.pi) * 256) & 0xFF
+
+
+def frame(body):
+    return FRAME.pack(len(body)) + body
+
+
+async def read_message(reader):
+    size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return await reader.readexactly(size)
+
+
+class EntityEncoder:
+    # Turns world entities into RECORD bytes
+    def __init__(self):
+        petals, mobs = spec_tables()
+        self.petal_index = {petal_key(spec): i for i, spec in enumerate(petals)}
+        self.mob_index = {mob_key(spec): i for i, spec in enumerate(mobs)}
+
+    def player(self, player):
+        health = int(255 * max(0, player.health) / player.max_health)
+        petals = [petal for petal in player.loadout if petal]
+        parts = [RECORD.pack(KIND_PLAYER, player.id, 0, quantize(player.pos[0]), quantize(player.pos[1]), 0, health),
+                 bytes((len(petals),))]
+        for petal in petals:
+            parts.append(PETAL.pack(self.petal_index[petal_key(petal.spec)], PETAL_STATES.index(petal.state),
+                                    quantize(petal.x), quantize(petal.y)))
+        return b"".join(parts)
+
+    def mobs(self, pool):
+        # RECORDs for the whole pool, row i for pool[i]
+        n = len(pool)
+        index = self.mob_index
+        specs = [mob.spec for mob in pool]
+        records = np.empty(n, RECORD_DTYPE)
+        records["kind"] = KIND_MOB
+        records["id"] = pool.id[:n]
+        records["spec"] = [index[mob_key(spec)] for spec in specs]
+        records["x"] = np.clip((pool.x[:n] * POSITION_SCALE).astype(np.int64), 0, 0xFFFF)
+        records["y"] = np.clip((pool.y[:n] * POSITION_SCALE).astype(np.int64), 0, 0xFFFF)
+        records["heading"] = (np.arctan2(pool.dy[:n], pool.dx[:n]) / (2 * math.pi) * 256).astype(np.int64) & 0xFF
+        max_health = np.array([spec.health for spec in specs], dtype=float)
+        records["health"] = (255 * np.maximum(0, pool.health[:n]) / max_health).astype(np.int64)
+        return records
+
+    def drop(self, drop):
+        return RECORD.pack(KIND_DROP, drop.id, self.petal_index[petal_key(drop.spec)], quantize(drop.x),
+                           quantize(drop.y), 0, 0)
+
+
+def entity_key(kind, id):
+    # One int per entity, so sets and numpy arrays of them stay cheap
+    return kind << 32 | id
+
+
+def encode_snapshot(tick, last_input, left, records, count):
+    # left is an array of keys of entities the client no longer sees,
+    # records the count RECORDs of ones that came into view or changed
+    # since it was last sent them
+    removed = np.empty(len(left), REMOVED_DTYPE)
+    removed["kind"] = left >> 32
+    removed["id"] = left & 0xFFFFFFFF
+    return frame(b"".join((SNAPSHOT.pack(MSG_SNAPSHOT, tick, last_input, len(left), count),
+                           removed.tobytes(), records)))
+
+
+class Entity:
+    # Client-side copy of what a record said
+    __slots__ = ("kind", "id", "spec", "x", "y", "heading", "health", "petals")
+
+    def __init__(self, kind, id):
+        self.kind = kind
+        self.id = id
+        self.petals = ()
+
+
+class SnapshotDecoder:
+    # Client side of encode_snapshot(): applies snapshots to self.entities
+    def __init__(self, images={}):
+        self.petals, self.mobs = spec_tables(images)
+        self.entities = {}      # (kind, id) -> Entity
+        self.tick = 0
+        self.last_input = 0
+
+    def apply(self, body):
+        view = memoryview(body)
+        _, self.tick, self.last_input, removed, changed = SNAPSHOT.unpack_from(view)
+        offset = SNAPSHOT.size
+        for _ in range(removed):
+            self.entities.pop(REMOVED.unpack_from(view, offset), None)
+            offset += REMOVED.size
+        for _ in range(changed):
+            kind, id, spec, x, y, angle, health = RECORD.unpack_from(view, offset)
+            offset += RECORD.size
+            entity = self.entities.get((kind, id))
+            if entity is None:
+                entity = self.entities[(kind, id)] = Entity(kind, id)
+            entity.x = x / POSITION_SCALE
+            entity.y = y / POSITION_SCALE
+            entity.heading = angle * 360 / 256
+            entity.health = health / 255
+            if kind == KIND_MOB:
+                entity.spec = self.mobs[spec]
+            elif kind == KIND_DROP:
+                entity.spec = self.petals[spec]
+            else:
+                entity.spec = None
+                count = view[offset]
+                offset += 1
+                petals = []
+                for _ in range(count):
+                    spec, state, x, y = PETAL.unpack_from(view, offset)
+                    offset += PETAL.size
+                    petals.append((self.petals[spec], PETAL_STATES[state], x / POSITION_SCALE, y / POSITION_SCALE))
+                entity.petals = petals
+        return self.tick
@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+
+
+def percentile(values, p):
+    # The p-th percentile of values, which must be sorted; 0 if there are none
+    return values[min(len(values) - 1, len(values) * p // 100)] if values else 0
+
+
+def rss_mb():
+    # Memory this process holds, in MB: right now on Linux, the peak so
+    # far elsewhere, 0 where neither can be had
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+class Profiler:
+    # Splits each frame into named phases with mark(), keeps a rolling
+    # window of per-phase times (ms) and counters, and can record every
+    # frame for export. While disabled, every call returns straight away.
+    def __init__(self, window=300, enabled=False):
+        self.enabled = enabled
+        self.recording = False
+        self.window = window
+        self.samples = {}       # Phase or counter -> deque of recent values
+        self.phases = []        # Phase names in the order they were first seen
+        self.frame = {}
+        self.last = 0
+        self.frame_start = 0
+        self.trace = []
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame = {}
+        self.frame_start = self.last = time.perf_counter()
+
+    def mark(self, name):
+        # Everything since the previous mark is charged to name
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame[name] = self.frame.get(name, 0) + (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self, **counters):
+        if not self.enabled:
+            return
+        frame = self.frame
+        frame["frame"] = (time.perf_counter() - self.frame_start) * 1000
+        for name, value in frame.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.phases.append(name)
+            self.samples[name].append(value)
+        for name, value in counters.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(value)
+        if self.recording:
+            row = dict(frame)
+            row.update(counters)
+            self.trace.append(row)
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        values = sorted(self.samples.get(name, ()))
+        return [percentile(values, p) for p in points]
+
+    def latest(self, name):
+        values = self.samples.get(name)
+        return values[-1] if values else 0
+
+    def start_recording(self):
+        self.enabled = True
+        self.recording = True
+        self.trace = []
+
+    def stop_recording(self):
+        self.recording = False
+        return self.trace
+
+    def export_csv(self, path):
+        fields = []
+        for row in self.trace:
+            for name in row:
+                if name not in fields:
+                    fields.append(name)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(self.trace)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.trace, f)
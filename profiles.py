@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import threading
+import time
+
+from events import MOB_HITS, PLAYER_HITS
+from netproto import petal_key
+
+# Player profiles: inventory, loadout and stats, by player name, kept in
+# a SQLite file so they outlive the process.
+#
+# The game never waits on the disk to save. ProfileStore.save() just puts
+# the profile in a dict of pending ones, replacing any earlier save of the
+# same name, and a writer thread takes the whole dict every flush_interval
+# seconds and writes it in one transaction. A profile saved every second
+# by a busy player is still one row write per flush. load() looks in the
+# pending dict first, so it always sees the latest save.
+#
+# Profiles are rows keyed by name, so opening the store reads nothing and
+# each load is one index lookup however many profiles there are.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,         -- JSON, see snapshot()
+    updated REAL NOT NULL
+)
+"""
+FORMAT = 1
+STATS = ("kills", "damage", "hurt", "deaths")
+SAVE_EVERY = 60         # Ticks between checking players for changes to save
+
+
+class ProfileStore:
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.pending = {}           # Name -> profile, not written yet
+        self.writing = {}           # The batch the writer is on
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.flushed = threading.Condition(self.lock)
+        self.closed = False
+        self.readers = threading.local()
+        self.written = 0            # Profiles written, and in how many transactions
+        self.batches = 0
+
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")     # Reads don't wait for the writer
+        conn.execute(SCHEMA)
+        conn.commit()
+        conn.close()
+        self.thread = threading.Thread(target=self.run, name="profile-writer", daemon=True)
+        self.thread.start()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self, name):
+        # The profile saved under name, None if there isn't one. Reads the
+        # file, so a server calls it off the game loop.
+        with self.lock:
+            profile = self.pending.get(name, self.writing.get(name))
+        if profile is not None:
+            return profile
+        conn = getattr(self.readers, "conn", None)
+        if conn is None:
+            conn = self.readers.conn = self.connect()
+        row = conn.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, name, profile):
+        with self.lock:
+            self.pending[name] = profile
+
+    def flush(self):
+        # Wait until everything saved so far is on disk
+        with self.lock:
+            while (self.pending or self.writing) and self.thread.is_alive():
+                self.wake.set()
+                self.flushed.wait(0.1)
+
+    def run(self):
+        conn = self.connect()   # Connections stay on the thread that made them
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            with self.lock:
+                batch = self.writing = self.pending
+                self.pending = {}
+                closed = self.closed
+            if batch:
+                now = time.time()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO profiles (name, data, updated) VALUES (?, ?, ?)",
+                                     [(name, json.dumps(profile), now) for name, profile in batch.items()])
+                self.written += len(batch)
+                self.batches += 1
+            with self.lock:
+                self.writing = {}
+                self.flushed.notify_all()
+            if closed:
+                break
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.wake.set()
+        self.thread.join()
+        conn = getattr(self.readers, "conn", None)
+        if conn is not None:
+            conn.close()
+
+
+def snapshot(player, stats):
+    # A player's profile as plain data, safe to hand to the writer thread
+    return {
+        "format": FORMAT,
+        "inventory": [[slot, stack[0].name, list(stack[0].rarity_color), stack[1]]
+                      for slot, stack in enumerate(player.inventory) if stack],
+        "loadout": [[slot, petal.name, list(petal.rarity_color)]
+                    for slot, petal in enumerate(player.loadout) if petal],
+        "stats": dict(stats),
+    }
+
+
+class ProfileSync:
+    # Keeps the profiles of a world's players up to date in a store:
+    # restores one when a player joins, saves the ones that changed every
+    # SAVE_EVERY ticks and when a player leaves. Stats come from the
+    # world's combat events.
+    def __init__(self, world, store, petal_specs, save_every=SAVE_EVERY):
+        self.world = world
+        self.store = store
+        self.specs = {petal_key(spec): spec for spec in petal_specs}
+        self.save_every = save_every
+        self.names = {}         # Player -> profile name
+        self.stats = {}         # Player -> stats
+        self.saved = {}         # Player -> (inventory version, loadout) when last saved
+        self.dirty = set()      # Players whose stats changed since
+        world.events.subscribe(MOB_HITS, self.on_mob_hits)
+        world.events.subscribe(PLAYER_HITS, self.on_player_hits)
+
+    def join(self, player, name, profile=None):
+        # profile is what store.load(name) returned, for callers that
+        # loaded it themselves off the game loop
+        if profile is None:
+            profile = self.store.load(name)
+        self.names[player] = name
+        self.stats[player] = dict.fromkeys(STATS, 0)
+        if profile is not None:
+            self.restore(player, profile)
+        self.saved[player] = (player.inventory.version, self.loadout(player))
+
+    def restore(self, player, profile):
+        world = self.world
+        self.stats[player].update(profile.get("stats", {}))
+        inventory = player.inventory
+        stacks = {}
+        for slot, name, color, count in profile.get("inventory", []):
+            spec = self.specs.get((name, tuple(color)))
+            if spec is not None and slot < len(inventory):     # Petals that no longer exist are dropped
+                stacks[slot] = (spec, count)
+        for slot in range(len(inventory)):
+            inventory[slot] = stacks.get(slot)
+
+        petals = {}
+        for slot, name, color in profile.get("loadout", []):
+            spec = self.specs.get((name, tuple(color)))
+            if spec is not None and slot < len(player.loadout):
+                petals[slot] = spec
+        for slot, petal in enumerate(player.loadout):
+            spec = petals.get(slot)
+            if petal and spec is not None and petal_key(petal.spec) == petal_key(spec):
+                continue
+            if petal:
+                world.unequip(player, slot)
+            if spec is not None:
+                world.equip(player, slot, spec)
+
+    def leave(self, player):
+        if player in self.names:
+            self.store.save(self.names[player], snapshot(player, self.stats[player]))
+            for table in (self.names, self.stats, self.saved):
+                del table[player]
+            self.dirty.discard(player)
+
+    def loadout(self, player):
+        return tuple(petal and petal.spec for petal in player.loadout)
+
+    def update(self):
+        # Once a tick; saves what changed every save_every ticks
+        if self.world.tick % self.save_every:
+            return
+        for player, name in self.names.items():
+            saved = (player.inventory.version, self.loadout(player))
+            if saved != self.saved[player] or player in self.dirty:
+                self.store.save(name, snapshot(player, self.stats[player]))
+                self.saved[player] = saved
+        self.dirty.clear()
+
+    def save_all(self):
+        for player, name in self.names.items():
+            self.store.save(name, snapshot(player, self.stats[player]))
+
+    def on_mob_hits(self, world, hits):
+        n = hits.count
+        for p, damage, killed in zip(hits.player[:n].tolist(), hits.damage[:n].tolist(), hits.killed[:n].tolist()):
+            player = hits.players[p]
+            stats = self.stats.get(player)
+            if stats is not None:
+                stats["damage"] += damage
+                stats["kills"] += killed
+                self.dirty.add(player)
+
+    def on_player_hits(self, world, bumps):
+        n = bumps.count
+        for p, damage in zip(bumps.player[:n].tolist(), bumps.damage[:n].tolist()):
+            player = bumps.players[p]
+            stats = self.stats.get(player)
+            if stats is not None:
+                stats["hurt"] += damage
+                self.dirty.add(player)
+        for player in set(bumps.players[p] for p in bumps.player[:n].tolist()):
+            if player.dead and player in self.stats:
+                self.stats[player]["deaths"] += 1
@@ -0,0 +1,148 @@
+import multiprocessing
+import signal
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from spatial import SpatialHash
+from mobpool import separate
+
+# Mob-vs-mob collisions, split across worker processes.
+#
+# The map is cut into vertical strips, one per worker, with borders put
+# where each strip gets about as many mobs. The borders are worked out
+# again every tick, so the pool has no state of its own to save.
+# Each tick the mobs' positions go into a shared-memory block. Each
+# worker separates the mobs in its strip, plus ghosts: mobs on the other
+# side of a border that are close enough to touch one of its own. Ghosts
+# get pushed too, but only locally; their owner's result is the one that
+# counts. Workers write their own mobs back to the block's output
+# columns, and the pool copies them into the MobPool.
+#
+# Mob state itself stays in the one MobPool, so a mob crossing a border
+# is handed off just by the next worker owning it next tick. Everything
+# else (movement, petals, players, spawning) runs in the main process,
+# it's vectorized already or only touches mobs near players.
+
+IN_COLUMNS = ("x", "y", "dx", "dy", "radius")
+OUT_COLUMNS = ("x", "y", "dx", "dy")
+
+
+def _columns(buf, capacity):
+    # Views of the block: input columns, then output columns
+    arrays = np.ndarray((len(IN_COLUMNS) + len(OUT_COLUMNS), capacity), dtype=np.float64, buffer=buf)
+    columns = dict(zip(IN_COLUMNS, arrays[:len(IN_COLUMNS)]))
+    columns.update(("out_" + name, array) for name, array in zip(OUT_COLUMNS, arrays[len(IN_COLUMNS):]))
+    return columns
+
+
+def _worker(conn, cell_size):
+    # Ctrl+C is for the main process, which then shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    grid = SpatialHash(cell_size)
+    block = columns = x = None
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        name, capacity, n, left, right, margin, bounce = message
+        if block is None or block.name != name:
+            if block is not None:
+                columns = x = None      # No views left into the old block
+                block.close()
+            block = shared_memory.SharedMemory(name)
+            columns = _columns(block.buf, capacity)
+        x = columns["x"][:n]
+        local = np.flatnonzero((x >= left - margin) & (x < right + margin))
+        xs = columns["x"][local].tolist()
+        ys = columns["y"][local].tolist()
+        dxs = columns["dx"][local].tolist()
+        dys = columns["dy"][local].tolist()
+        radii = columns["radius"][local].tolist()
+        grid.build(range(len(local)), xs, ys, radii)
+        separate(xs, ys, dxs, dys, radii, grid.query_pairs(), bounce)
+
+        owned = (x[local] >= left) & (x[local] < right)
+        rows = local[owned]
+        for name, values in (("x", xs), ("y", ys), ("dx", dxs), ("dy", dys)):
+            columns["out_" + name][rows] = np.array(values)[owned]
+        conn.send(len(rows))
+    columns = x = None
+    if block is not None:
+        block.close()
+
+
+class RegionPool:
+    def __init__(self, workers, cell_size):
+        self.workers = workers
+        self.cell_size = cell_size
+        self.block = None
+        self.capacity = 0
+        self.ghosts = 0         # Mobs simulated twice last tick, at the borders
+        self.conns = []
+        self.processes = []
+        # Workers share our resource tracker, so the blocks they attach to
+        # aren't cleaned up behind our back when one of them exits
+        resource_tracker.ensure_running()
+        for _ in range(workers):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, cell_size), daemon=True)
+            process.start()
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    def _reserve(self, n):
+        if n <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < n:
+            capacity *= 2
+        if self.block is not None:
+            self.columns = None
+            self.block.close()
+            self.block.unlink()
+        size = 8 * capacity * (len(IN_COLUMNS) + len(OUT_COLUMNS))
+        self.block = shared_memory.SharedMemory(create=True, size=size)
+        self.capacity = capacity
+        self.columns = _columns(self.block.buf, capacity)
+
+    def separate(self, mobs, rows=None):
+        # Every mob, or just rows of them
+        n = len(mobs) if rows is None else len(rows)
+        if rows is None:
+            rows = slice(0, n)
+        if n == 0:
+            return
+        self._reserve(n)
+        columns = self.columns
+        for name in IN_COLUMNS:
+            columns[name][:n] = getattr(mobs, name)[rows]
+
+        x = columns["x"][:n]
+        borders = np.quantile(x, np.linspace(0, 1, self.workers + 1)[1:-1]).tolist()
+        bounds = [-np.inf] + borders + [np.inf]
+        margin = 2 * float(columns["radius"][:n].max())
+        for i, conn in enumerate(self.conns):
+            conn.send((self.block.name, self.capacity, n, bounds[i], bounds[i + 1], margin, mobs.bounce()))
+        owned = sum(conn.recv() for conn in self.conns)
+        if owned != n:
+            raise RuntimeError("region workers owned %d of %d mobs" % (owned, n))
+        self.ghosts = int(sum(np.count_nonzero(np.abs(x - border) < margin) for border in borders))
+
+        for name in OUT_COLUMNS:
+            getattr(mobs, name)[rows] = columns["out_" + name][:n]
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(1)
+        if self.block is not None:
+            self.columns = None
+            self.block.close()
+            self.block.unlink()
+            self.block = None
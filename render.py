@@ -0,0 +1,213 @@
+import math
+
+import numpy as np
+import pygame
+
+from assets import AssetManager
+from rotcache import RotationCache
+from background import Background
+from drawqueue import DrawQueue, PLAYERS, PETALS, BARS, MOBS, DROPS
+from world import camera_origin, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE, PLAYER_RADIUS, PETAL_SIZE
+
+# Colors
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+
+MAX_LERP = 100          # Moved further than this in a tick: drawn where it is, not slid there
+
+
+# Name -> (file in assets/, scale)
+SPRITES = {
+    "basic": ("basic.png", (PETAL_SIZE*2, PETAL_SIZE*2)),
+    "pollen": ("pollen.png", (PETAL_SIZE*2, PETAL_SIZE*2)),
+    "stinger": ("stinger.png", (PETAL_SIZE*2, PETAL_SIZE*2)),
+    "missile": ("missile.png", (PETAL_SIZE*4, PETAL_SIZE*2)),
+    "common_bee": ("bee.png", None),
+    "unusual_bee": ("bee.png", 1.5),
+}
+
+
+def load_images(path="assets"):
+    # Loaded lazily, by name
+    return AssetManager(SPRITES, path)
+
+
+def health_bar_sprite(health_width, width=PLAYER_RADIUS*4, height=20):
+    surface = pygame.Surface((width, height))
+    # Background
+    pygame.draw.rect(surface, (100, 100, 100), (0, 0, width, height))
+    # Foreground (scaled to health)
+    pygame.draw.rect(surface, (0, 255, 0), (0, 0, health_width, height))
+    # Border
+    pygame.draw.rect(surface, (255, 255, 255), (0, 0, width, height), 2)
+    return surface
+
+
+class Renderer:
+    # Draws a World from the camera's point of view
+    def __init__(self, width, height, images, map_width=MAP_WIDTH, map_height=MAP_HEIGHT):
+        self.width = width
+        self.height = height
+        self.map_width = map_width
+        self.map_height = map_height
+        self.camera_x = 0
+        self.camera_y = 0
+
+        # Entities drawn vs. skipped for being off camera, reset every frame
+        self.cull_stats = {"drawn": 0, "culled": 0}
+
+        # Every sprite that gets drawn rotated, at every angle it can be drawn at
+        self.rotations = RotationCache()
+        self.rotations.prewarm(list(images.values()))
+        self.background = Background(map_width, map_height, TILE_SIZE, width, height)
+
+        # Largest distance from a mob's centre its rotated sprite can reach
+        self.mob_reach = max(max(images["common_bee"].get_size()), max(images["unusual_bee"].get_size()))
+
+        # What gets drawn, filled by queue_world() and queue_drop()
+        self.queue = DrawQueue()
+        self.player_sprite = pygame.Surface((PLAYER_RADIUS * 2 + 1, PLAYER_RADIUS * 2 + 1), pygame.SRCALPHA)
+        pygame.draw.circle(self.player_sprite, GREEN, (PLAYER_RADIUS, PLAYER_RADIUS), PLAYER_RADIUS)
+        self.bars = {}          # Health bar sprites by width of the green part
+
+        # Where things were before the last world.step(), to draw them
+        # alpha of the way from there to where they are now
+        self.alpha = 1.0
+        self.last_positions = {}    # Player id, or (player id, slot) for a petal -> (x, y)
+        self.last_mob_ids = np.empty(0, dtype=np.int64)
+        self.last_mob_x = self.last_mob_y = np.empty(0)
+
+    def remember(self, world):
+        # Call before each world.step()
+        positions = {}
+        for player in world.players:
+            positions[player.id] = (player.pos[0], player.pos[1])
+            for slot, petal in enumerate(player.loadout):
+                if petal:
+                    positions[player.id, slot] = (petal.x, petal.y)
+        self.last_positions = positions
+        mobs = world.mobs
+        n = len(mobs)
+        # Sorted by id for queue_mobs() to search; rows get reordered as mobs die
+        order = np.argsort(mobs.id[:n], kind="stable")
+        self.last_mob_ids = mobs.id[:n][order]
+        self.last_mob_x = mobs.x[:n][order]
+        self.last_mob_y = mobs.y[:n][order]
+
+    def lerp(self, key, x, y):
+        # Position to draw something at, now at (x, y)
+        last = self.last_positions.get(key)
+        if last is None or self.alpha >= 1:
+            return x, y
+        if abs(x - last[0]) > MAX_LERP or abs(y - last[1]) > MAX_LERP:
+            return x, y     # Teleported (respawn, reload), don't slide it there
+        return last[0] + (x - last[0]) * self.alpha, last[1] + (y - last[1]) * self.alpha
+
+    def update_camera(self, player_pos):
+        self.camera_x, self.camera_y = camera_origin(player_pos, self.width, self.height,
+                                                     self.map_width, self.map_height)
+
+    def in_view(self, x, y, reach):
+        # Does a sprite centred on (x, y), reaching at most reach from its centre, touch the camera?
+        if (x + reach > self.camera_x and x - reach < self.camera_x + self.width and
+                y + reach > self.camera_y and y - reach < self.camera_y + self.height):
+            self.cull_stats["drawn"] += 1
+            return True
+        self.cull_stats["culled"] += 1
+        return False
+
+    def draw_map(self, surface):
+        # Draw grid lines for reference, from pre-rendered chunks
+        self.background.draw(surface, self.camera_x, self.camera_y)
+
+    def queue_player(self, player):
+        x, y = self.lerp(player.id, player.pos[0], player.pos[1])
+        self.queue.add(PLAYERS, self.player_sprite, (int(x - self.camera_x) - PLAYER_RADIUS,
+                                                     int(y - self.camera_y) - PLAYER_RADIUS))
+
+    def queue_petal(self, petal, key):
+        if petal.state != "reloading":  # Don't draw while reloading
+            x, y = self.lerp(key, petal.x, petal.y)
+            if not self.in_view(x, y, max(petal.color.get_size())):
+                return
+            camera_x, camera_y = self.camera_x, self.camera_y
+            topleft = (int(x - camera_x) - petal.color.get_width() // 2,
+                       int(y - camera_y) - petal.color.get_height() // 2)
+            if petal.state == "orbiting":
+                angle = -petal.angle
+            else:
+                angle = -math.atan2(petal.dy, petal.dx)/math.pi*180
+            self.queue.add(PETALS, *self.rotations.place(petal.color, topleft, angle))
+
+    def queue_health_bar(self, player):
+        x, y = self.lerp(player.id, player.pos[0], player.pos[1])
+        width = PLAYER_RADIUS * 4
+        health_width = min(width, max(0, int(width * (player.health / player.max_health))))
+        bar = self.bars.get(health_width)
+        if bar is None:
+            bar = self.bars[health_width] = health_bar_sprite(health_width, width)
+        self.queue.add(BARS, bar, (int(x - self.camera_x) - 2 * PLAYER_RADIUS,
+                                   int(y - self.camera_y) + PLAYER_RADIUS + 10))
+
+    def queue_mobs(self, mobs):
+        # Cull the whole pool against the camera in one go, then queue what's left
+        camera_x, camera_y = self.camera_x, self.camera_y
+        rows = mobs.visible_rows(camera_x, camera_y, camera_x + self.width, camera_y + self.height, self.mob_reach)
+        self.cull_stats["drawn"] += len(rows)
+        self.cull_stats["culled"] += len(mobs) - len(rows)
+        xs, ys = mobs.x[rows], mobs.y[rows]
+        if self.alpha < 1 and len(self.last_mob_ids):
+            # Mobs by id, since rows move around as mobs die
+            ids = mobs.id[rows]
+            last = np.minimum(np.searchsorted(self.last_mob_ids, ids), len(self.last_mob_ids) - 1)
+            known = self.last_mob_ids[last] == ids
+            last_x, last_y = self.last_mob_x[last], self.last_mob_y[last]
+            xs = np.where(known, last_x + (xs - last_x) * self.alpha, xs)
+            ys = np.where(known, last_y + (ys - last_y) * self.alpha, ys)
+        xs = (xs - camera_x).tolist()
+        ys = (ys - camera_y).tolist()
+        angles = (-np.arctan2(mobs.dy[rows], mobs.dx[rows]) / math.pi * 180).tolist()
+        views = mobs.mobs
+        add, place = self.queue.add, self.rotations.place
+        for i, x, y, angle in zip(rows.tolist(), xs, ys, angles):
+            texture = views[i].spec.texture
+            topleft = (int(x) - texture.get_width() // 2, int(y) - texture.get_height() // 2)
+            add(MOBS, *place(texture, topleft, angle))
+
+    def queue_drop(self, drop):
+        if not self.in_view(drop.x, drop.y, max(drop.spec.color.get_size())):
+            return
+        self.queue.add(DROPS, drop.spec.color, (int(drop.x - self.camera_x)-drop.radius,
+                                                int(drop.y - self.camera_y)-drop.radius))
+
+    def queue_world(self, world):
+        # Players, petals, health bars and mobs, from the camera's point of view
+        self.cull_stats["drawn"] = 0
+        self.cull_stats["culled"] = 0
+        for player in world.players:
+            if player.dead:
+                continue
+            self.queue_player(player)
+            for slot, petal in enumerate(player.loadout):
+                if petal:
+                    self.queue_petal(petal, (player.id, slot))
+            self.queue_health_bar(player)
+        self.queue_mobs(world.mobs)
+
+    def draw_world(self, surface, world):
+        # Everything under the HUD: map, then the queued sprites layer by layer
+        mark = world.profiler.mark
+        self.draw_map(surface)
+        mark("map")
+        self.queue_world(world)
+        self.queue.flush(surface, (PLAYERS, PETALS, BARS, MOBS))
+        mark("draw")
+
+    def draw_drops(self, surface, world):
+        # Drops go on top of the HUD
+        for drop in world.drops:
+            self.queue_drop(drop)
+        self.queue.flush(surface, (DROPS,))
+
+    def surfaces_allocated(self):
+        return self.rotations.misses + self.background.created + len(self.bars)
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class RotationCache:
+    # Rotated copies of sprites, keyed by (surface, angle rounded to step
+    # degrees). Least recently used entries are dropped once the cached
+    # pixels go over max_bytes.
+    def __init__(self, step=2, max_bytes=64 * 1024 * 1024):
+        self.step = step
+        self.slots = max(1, int(round(360 / step)))
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image, angle):
+        key = (image, int(round(angle / self.step)) % self.slots)
+        rotated = self.entries.get(key)
+        if rotated is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return rotated
+
+        self.misses += 1
+        rotated = pygame.transform.rotate(image, key[1] * self.step)
+        self.entries[key] = rotated
+        self.bytes += rotated.get_pitch() * rotated.get_height()
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.bytes -= old.get_pitch() * old.get_height()
+            self.evictions += 1
+        return rotated
+
+    def place(self, image, topleft, angle):
+        # Same as util.blitRotate2: rotate, then keep the centre where the
+        # unrotated image would have had it. Returns (rotated, position).
+        rotated = self.get(image, angle)
+        w, h = image.get_size()
+        rw, rh = rotated.get_size()
+        return rotated, (topleft[0] + w // 2 - rw // 2, topleft[1] + h // 2 - rh // 2)
+
+    def prewarm(self, images):
+        for image in images:
+            for slot in range(self.slots):
+                self.get(image, slot * self.step)
+        # Warming up isn't a miss anyone should see in the stats
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,409 @@
+import argparse
+import heapq
+import mmap
+import struct
+import time
+
+import numpy as np
+
+from world import World, Player
+from inventory import Inventory
+from spawning import Spawner, Zone
+from netproto import spec_tables, petal_key, mob_key, pack_inputs, unpack_inputs, PETAL_STATES
+
+# Binary save files (.flws) and input-log replays (.flrp).
+#
+# A save file is a header, a table of sections, then the sections. Every
+# section is an array of fixed-layout little-endian records (the dtypes
+# below), 8-byte aligned, so loading is np.frombuffer() over a memory-mapped
+# file. The mob pool is stored column by column and adopted as-is, so the
+# bulk of a big world is never copied on load.
+#
+# A replay is a save file of the starting state followed by an event log:
+# players joining, leaving, changing the keys they hold and rearranging
+# their loadout and inventory, by tick, and where the recording ended. Loading the state and feeding the events back
+# in re-runs the game exactly.
+
+MAGIC = b"FLWS"
+VERSION = 4
+
+HEADER = struct.Struct("<4sHHQIIIiQQBBBxH2x") # magic, version, sections, tick, map width, map height,
+                                              # max mobs, local player index, next id, next mob id, game over,
+                                              # respawn, region workers, tick rate
+SECTION = struct.Struct("<8sQQ")            # name, offset, record count
+
+PY_RANDOM = struct.Struct("<625I?d")        # Mersenne Twister state, gauss_next
+NP_RANDOM = struct.Struct("<16s16sII")      # PCG64 state and increment, has_uint32, uinteger
+
+SPAWNER = np.dtype([("min_player_distance", "<f8"), ("despawn_distance", "<f8"), ("despawn_idle", "<i8")])
+ZONE = np.dtype([("name", "S32"), ("left", "<f8"), ("top", "<f8"), ("right", "<f8"), ("bottom", "<f8"),
+                 ("target", "<u4"), ("entries", "<u4"), ("interval", "<f8"), ("due", "<i8")])
+ENTRY = np.dtype([("spec", "<u2"), ("weight", "<f8")])     # Spawn tables, zone after zone
+PLAYER = np.dtype([("id", "<u4"), ("x", "<f8"), ("y", "<f8"), ("health", "<f8"), ("max_health", "<f8"),
+                   ("knockback_dx", "<f8"), ("knockback_dy", "<f8"), ("knockback_timer", "<i4"),
+                   ("petal_offset", "<f8"), ("petal_radius", "<i4"), ("loadout", "<u2"), ("inventory", "<u2"),
+                   ("dead", "u1"), ("inputs", "u1")])
+PETAL = np.dtype([("player", "<u4"), ("slot", "<u2"), ("spec", "<u2"), ("state", "u1"), ("angle", "<f8"),
+                  ("x", "<f8"), ("y", "<f8"), ("dx", "<f8"), ("dy", "<f8"), ("speed", "<f8"),
+                  ("return_timer", "<i4"), ("reload_timer", "<i4")])
+STACK = np.dtype([("player", "<u4"), ("slot", "<u2"), ("spec", "<u2"), ("count", "<u4")])
+DROP = np.dtype([("id", "<u4"), ("spec", "<u2"), ("x", "<f8"), ("y", "<f8"), ("radius", "<f8"), ("timer", "<i8")])
+MOB_COLUMNS = [(name, np.dtype("<f8")) for name in ("x", "y", "dx", "dy", "speed", "radius", "health", "damage")]
+MOB_COLUMNS += [("angry", np.dtype("?")), ("id", np.dtype("<i8")), ("idle", np.dtype("<i8")),
+                ("spec", np.dtype("u1"))]
+
+REPLAY_MAGIC = b"FLRP"
+REPLAY_HEADER = struct.Struct("<4sHxxQ")    # magic, version, save file size
+EVENT = np.dtype([("tick", "<u4"), ("player", "<u4"), ("kind", "u1"), ("inputs", "u1"), ("slot", "<u2"),
+                  ("spec", "<u2"), ("count", "<u4")])
+EVENT_INPUTS, EVENT_JOIN, EVENT_LEAVE, EVENT_EQUIP, EVENT_STACK, EVENT_END = range(6)
+NO_SPEC = 0xFFFF
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _random_state(world):
+    version, state, gauss = world.random.getstate()
+    np_state = world.mobs.rng.bit_generator.state
+    return (PY_RANDOM.pack(*state, gauss is not None, gauss or 0.0) +
+            NP_RANDOM.pack(np_state["state"]["state"].to_bytes(16, "little"),
+                           np_state["state"]["inc"].to_bytes(16, "little"),
+                           np_state["has_uint32"], np_state["uinteger"]))
+
+
+def _set_random_state(world, data):
+    values = PY_RANDOM.unpack_from(data)
+    world.random.setstate((3, values[:625], values[626] if values[625] else None))
+    state, inc, has_uint32, uinteger = NP_RANDOM.unpack_from(data, PY_RANDOM.size)
+    world.mobs.rng.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": int.from_bytes(state, "little"), "inc": int.from_bytes(inc, "little")},
+        "has_uint32": has_uint32, "uinteger": uinteger,
+    }
+
+
+def save_bytes(world):
+    petal_specs, mob_specs = spec_tables()
+    petal_index = {petal_key(spec): i for i, spec in enumerate(petal_specs)}
+    mob_index = {mob_key(spec): i for i, spec in enumerate(mob_specs)}
+
+    spawner = []
+    zones = []
+    entries = []
+    if world.spawner:
+        spawner.append((world.spawner.min_player_distance, world.spawner.despawn_distance,
+                        world.spawner.despawn_idle))
+        due = {i: tick for tick, i in world.spawner.due}
+        for i, zone in enumerate(world.spawner.zones):
+            zones.append((zone.name.encode(), *zone.rect, zone.target, len(zone.specs), zone.interval,
+                          due.get(i, -1)))
+            last = 0
+            for spec, total in zip(zone.specs, zone.weights):
+                entries.append((mob_index[mob_key(spec)], total - last))
+                last = total
+    players = []
+    petals = []
+    stacks = []
+    for p, player in enumerate(world.players):
+        players.append((player.id, player.pos[0], player.pos[1], player.health, player.max_health,
+                        player.knockback_dx, player.knockback_dy, player.knockback_timer, player.petal_offset,
+                        player.petal_radius, len(player.loadout), len(player.inventory), player.dead,
+                        pack_inputs(player.inputs)))
+        for slot, petal in enumerate(player.loadout):
+            if petal:
+                petals.append((p, slot, petal_index[petal_key(petal.spec)], PETAL_STATES.index(petal.state),
+                               petal.angle, petal.x, petal.y, petal.dx, petal.dy, petal.speed, petal.return_timer,
+                               petal.reload_timer))
+        for slot, stack in enumerate(player.inventory):
+            if stack:
+                stacks.append((p, slot, petal_index[petal_key(stack[0])], stack[1]))
+    drops = [(drop.id, petal_index[petal_key(drop.spec)], drop.x, drop.y, drop.radius, drop.timer)
+             for drop in world.drops]
+
+    mobs = world.mobs
+    n = len(mobs)
+    columns = []
+    for name, dtype in MOB_COLUMNS:
+        if name == "spec":
+            column = np.array([mob_index[mob_key(mob.spec)] for mob in mobs], dtype=dtype)
+        else:
+            column = getattr(mobs, name)[:n].astype(dtype)
+        data = column.tobytes()
+        columns.append(data + bytes(_align(len(data)) - len(data)))
+
+    sections = [
+        (b"random", 1, _random_state(world)),
+        (b"spawner", len(spawner), np.array(spawner, dtype=SPAWNER).tobytes()),
+        (b"zones", len(zones), np.array(zones, dtype=ZONE).tobytes()),
+        (b"entries", len(entries), np.array(entries, dtype=ENTRY).tobytes()),
+        (b"players", len(players), np.array(players, dtype=PLAYER).tobytes()),
+        (b"petals", len(petals), np.array(petals, dtype=PETAL).tobytes()),
+        (b"stacks", len(stacks), np.array(stacks, dtype=STACK).tobytes()),
+        (b"drops", len(drops), np.array(drops, dtype=DROP).tobytes()),
+        (b"mobs", n, b"".join(columns)),
+    ]
+
+    local = world.players.index(world.player) if world.player is not None else -1
+    offset = _align(HEADER.size + SECTION.size * len(sections))
+    table = []
+    body = []
+    for name, count, data in sections:
+        table.append(SECTION.pack(name, offset, count))
+        body.append(data + bytes(_align(len(data)) - len(data)))
+        offset += _align(len(data))
+    head = HEADER.pack(MAGIC, VERSION, len(sections), world.tick, world.map_width, world.map_height, world.max_mobs,
+                       local, world.next_id, mobs.next_id, world.game_over, world.respawn_players,
+                       world.regions.workers if world.regions else 0, world.rate)
+    head += b"".join(table)
+    return head + bytes(_align(len(head)) - len(head)) + b"".join(body)
+
+
+def save(world, path):
+    with open(path, "wb") as f:
+        f.write(save_bytes(world))
+
+
+def load_buffer(buf, images={}, profiler=None):
+    # Builds a World from a save file in buf (bytes, mmap or memoryview).
+    # With a writable buf the mob arrays are views into it, not copies.
+    # It gets as many region workers as the saved world had, since where
+    # the region borders fall changes how mobs collide, and its tick rate.
+    magic, version, section_count, tick, map_width, map_height, max_mobs, local, next_id, next_mob_id, \
+        game_over, respawn, workers, rate = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("not a save file")
+    if version != VERSION:
+        raise ValueError("save file version %d, expected %d" % (version, VERSION))
+    sections = {}
+    for i in range(section_count):
+        name, offset, count = SECTION.unpack_from(buf, HEADER.size + SECTION.size * i)
+        sections[name.rstrip(b"\0")] = (offset, count)
+
+    def records(name, dtype):
+        offset, count = sections[name]
+        return np.frombuffer(buf, dtype, count, offset)
+
+    petal_specs, mob_specs = spec_tables(images)
+    spawner = None
+    for min_player_distance, despawn_distance, despawn_idle in records(b"spawner", SPAWNER).tolist():
+        entries = records(b"entries", ENTRY).tolist()
+        zones = []
+        due = []
+        for i, (name, left, top, right, bottom, target, count, interval, tick_due) in \
+                enumerate(records(b"zones", ZONE).tolist()):
+            table = [(mob_specs[spec], weight) for spec, weight in entries[:count]]
+            del entries[:count]
+            zones.append(Zone(name.decode(), (left, top, right, bottom), target, interval, table))
+            if tick_due >= 0:
+                due.append((tick_due, i))
+        spawner = Spawner(zones, min_player_distance, despawn_distance, despawn_idle)
+        spawner.due = due
+        heapq.heapify(due)
+    world = World(spawner, map_width=map_width, map_height=map_height, max_mobs=max_mobs, profiler=profiler,
+                  local_player=False, respawn=bool(respawn), workers=workers, rate=rate)
+    world.spawner = spawner     # None if the saved world had none
+    world.tick = tick
+    world.next_id = next_id
+    world.game_over = bool(game_over)
+    offset, count = sections[b"random"]
+    _set_random_state(world, memoryview(buf)[offset:offset + PY_RANDOM.size + NP_RANDOM.size])
+
+    for row in records(b"players", PLAYER).tolist():
+        (id, x, y, health, max_health, knockback_dx, knockback_dy, knockback_timer, petal_offset, petal_radius,
+         loadout_size, inventory_size, dead, inputs) = row
+        player = Player(id, x, y, [None] * loadout_size)
+        player.health = health
+        player.max_health = max_health
+        player.knockback_dx = knockback_dx
+        player.knockback_dy = knockback_dy
+        player.knockback_timer = knockback_timer
+        player.petal_offset = petal_offset
+        player.petal_radius = petal_radius
+        player.inventory = Inventory(inventory_size)
+        player.dead = bool(dead)
+        player.inputs = unpack_inputs(inputs)
+        world.players.append(player)
+    if local >= 0:
+        world.player = world.players[local]
+
+    for p, slot, spec, state, angle, x, y, dx, dy, speed, return_timer, reload_timer in \
+            records(b"petals", PETAL).tolist():
+        petal = world.new_petal(petal_specs[spec], angle)
+        petal.state = PETAL_STATES[state]
+        petal.x, petal.y, petal.dx, petal.dy, petal.speed = x, y, dx, dy, speed
+        petal.return_timer = return_timer
+        petal.reload_timer = reload_timer
+        world.players[p].loadout[slot] = petal
+    for p, slot, spec, count in records(b"stacks", STACK).tolist():
+        world.players[p].inventory[slot] = (petal_specs[spec], count)
+    for id, spec, x, y, radius, timer in records(b"drops", DROP).tolist():
+        drop = world.drop_pool.get().reset(x, y, petal_specs[spec], id)
+        drop.radius = radius
+        drop.timer = timer
+        world.drops.append(drop)
+
+    offset, count = sections[b"mobs"]
+    columns = {}
+    for name, dtype in MOB_COLUMNS:
+        column = np.frombuffer(buf, dtype, count, offset)
+        if not column.flags.writeable:
+            column = column.copy()      # Read-only buffer, e.g. bytes
+        columns[name] = column
+        offset += _align(dtype.itemsize * count)
+    world.mobs.adopt(columns, [mob_specs[spec] for spec in columns["spec"].tolist()], next_mob_id)
+    return world
+
+
+def load(path, images={}, profiler=None):
+    # Copy-on-write mapping: pages are only read in (and only copied once
+    # the game writes to them) as they're touched
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return load_buffer(buf, images, profiler)
+
+
+class Recorder:
+    # Writes a replay: call record() every tick, after the players' inputs
+    # are set and before world.step()
+    def __init__(self, world, path):
+        self.world = world
+        self.file = open(path, "wb")
+        state = save_bytes(world)
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, VERSION, len(state)))
+        self.file.write(state)
+        self.file.flush()
+        petal_specs = spec_tables()[0]
+        self.petal_index = {petal_key(spec): i for i, spec in enumerate(petal_specs)}
+        self.inputs = {player.id: pack_inputs(player.inputs) for player in world.players}
+        self.inventories = {player.id: list(player.inventory) for player in world.players}
+        self.versions = {player.id: player.inventory.version for player in world.players}
+        world.equips = []
+
+    def spec_index(self, spec):
+        return NO_SPEC if spec is None else self.petal_index[petal_key(spec)]
+
+    def record(self):
+        world = self.world
+        tick = world.tick + 1
+        players = {player.id: player for player in world.players}
+        events = []
+        for id in list(self.inputs):
+            if id not in players:
+                events.append((tick, id, EVENT_LEAVE, 0, 0, 0, 0))
+                del self.inputs[id]
+                del self.inventories[id]
+                del self.versions[id]
+        for id, player in players.items():
+            if id not in self.inputs:
+                events.append((tick, id, EVENT_JOIN, 0, 0, 0, 0))
+                self.inventories[id] = [None] * len(player.inventory)
+                self.versions[id] = -1
+            bits = pack_inputs(player.inputs)
+            if self.inputs.get(id) != bits:
+                events.append((tick, id, EVENT_INPUTS, bits, 0, 0, 0))
+                self.inputs[id] = bits
+        # Loadout changes in the order they happened, then inventory slots
+        # that differ from last tick
+        for player, slot, spec in world.equips:
+            events.append((tick, player.id, EVENT_EQUIP, 0, slot, self.spec_index(spec), 0))
+        world.equips.clear()
+        for id, player in players.items():
+            if player.inventory.version == self.versions[id]:
+                continue
+            self.versions[id] = player.inventory.version
+            last = self.inventories[id]
+            for slot, stack in enumerate(player.inventory):
+                if stack != last[slot]:
+                    spec, count = stack if stack else (None, 0)
+                    events.append((tick, id, EVENT_STACK, 0, slot, self.spec_index(spec), count))
+                    last[slot] = stack
+        if events:
+            self.file.write(np.array(events, dtype=EVENT).tobytes())
+            self.file.flush()   # So a crash or kill still leaves a usable replay
+
+    def close(self):
+        self.world.equips = None
+        self.file.write(np.array([(self.world.tick, 0, EVENT_END, 0, 0, 0, 0)], dtype=EVENT).tobytes())
+        self.file.close()
+
+
+class Replay:
+    # Re-runs a recorded game, tick by tick
+    def __init__(self, path, images={}, profiler=None):
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, size = REPLAY_HEADER.unpack_from(self.buf)
+        if magic != REPLAY_MAGIC:
+            raise ValueError("not a replay")
+        if version != VERSION:
+            raise ValueError("replay version %d, expected %d" % (version, VERSION))
+        start = REPLAY_HEADER.size
+        self.world = load_buffer(memoryview(self.buf)[start:start + size], images, profiler)
+        self.petal_specs = spec_tables(images)[0]
+        log = len(self.buf) - start - size
+        self.events = np.frombuffer(self.buf, EVENT, log // EVENT.itemsize, start + size).tolist()
+        self.cursor = 0
+        # A recording that wasn't closed properly just ends at its last event
+        self.end = self.events[-1][0] if self.events else self.world.tick
+
+    def done(self):
+        return self.world.tick >= self.end
+
+    def step(self):
+        world = self.world
+        tick = world.tick + 1
+        events = self.events
+        players = {player.id: player for player in world.players}
+        while self.cursor < len(events) and events[self.cursor][0] == tick:
+            _, id, kind, bits, slot, spec, count = events[self.cursor]
+            self.cursor += 1
+            spec = None if spec == NO_SPEC else self.petal_specs[spec]
+            if kind == EVENT_JOIN:
+                player = players[id] = world.add_player()
+                if player.id != id:
+                    raise ValueError("replay diverged: player %d joined as %d" % (id, player.id))
+            elif kind == EVENT_LEAVE:
+                world.remove_player(players.pop(id))
+            elif kind == EVENT_INPUTS:
+                players[id].inputs = unpack_inputs(bits)
+            elif kind == EVENT_EQUIP:
+                if spec is None:
+                    world.unequip(players[id], slot)
+                else:
+                    world.equip(players[id], slot, spec)
+            elif kind == EVENT_STACK:
+                players[id].inventory[slot] = (spec, count) if spec else None
+        world.step()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect save files, re-run replays")
+    parser.add_argument("path")
+    parser.add_argument("--ticks", type=int, help="replay this many ticks (default: to the end of the log)")
+    parser.add_argument("--save", help="save the world where the replay stops")
+    args = parser.parse_args()
+
+    if args.path.endswith(".flrp"):
+        replay = Replay(args.path)
+        world = replay.world
+        start = time.perf_counter()
+        first = world.tick
+        while not replay.done() if args.ticks is None else world.tick - first < args.ticks:
+            replay.step()
+        elapsed = time.perf_counter() - start
+        print("replayed %d ticks in %.2fs (%.0f ticks/s)" % (world.tick - first, elapsed,
+                                                            (world.tick - first) / max(elapsed, 1e-9)))
+    else:
+        start = time.perf_counter()
+        world = load(args.path)
+        print("loaded in %.1f ms" % ((time.perf_counter() - start) * 1000))
+    print("tick %d  players %d  mobs %d  drops %d" % (world.tick, len(world.players), len(world.mobs),
+                                                       len(world.drops)))
+    if args.save:
+        save(world, args.save)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from world import World, make_spawner, MAX_MOBS
+from interest import InterestManager, View
+from savefile import Recorder
+from profiles import ProfileStore, ProfileSync
+from profiler import percentile, rss_mb
+from netproto import (encode_snapshot, read_message, frame, unpack_inputs, spec_tables, VERSION,
+                      MSG_WELCOME, MSG_INPUT, MSG_HELLO, WELCOME, INPUT, HELLO)
+
+# Headless authoritative server: owns one World, steps it at a fixed rate
+# and sends each connected client the entities around its camera.
+#
+#   python server.py                                      # localhost:7000, 30 Hz
+#   python bots.py --server 127.0.0.1:7000 --bots 100     # load it up from another terminal
+
+VIEW_WIDTH, VIEW_HEIGHT = 800, 600      # What a client's camera shows
+ENTER_MARGIN = 100                      # Send things a little before they come into view,
+LEAVE_MARGIN = 200                      # and forget them a little after they leave it
+MAX_BUFFERED = 256 * 1024               # Skip snapshots for clients this far behind
+
+
+class Client:
+    def __init__(self, player, writer):
+        self.player = player
+        self.writer = writer
+        self.view = View(player)
+        self.last_input = 0
+        self.skipped = 0        # Snapshots not sent since the last report, for a full buffer
+
+
+class GameServer:
+    def __init__(self, host="127.0.0.1", port=7000, rate=30, seed=None, max_mobs=MAX_MOBS, record=None,
+                 workers=0, profiles=None):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.world = World(make_spawner(), seed=seed, max_mobs=max_mobs, local_player=False, respawn=True,
+                           workers=workers, rate=rate)
+        self.interest = InterestManager(self.world, VIEW_WIDTH, VIEW_HEIGHT, ENTER_MARGIN, LEAVE_MARGIN)
+        self.clients = []
+        self.recorder = Recorder(self.world, record) if record else None
+        self.profiles = ProfileSync(self.world, ProfileStore(profiles), spec_tables()[0]) if profiles else None
+
+        # Reset by report()
+        self.tick_times = []
+        self.overruns = 0
+        self.bytes_sent = 0
+
+    async def handle(self, reader, writer):
+        world = self.world
+        client = Client(world.add_player(), writer)
+        self.clients.append(client)
+        writer.write(frame(WELCOME.pack(MSG_WELCOME, VERSION, client.player.id, self.rate,
+                                        world.map_width, world.map_height)))
+        try:
+            while True:
+                body = await read_message(reader)
+                if body[0] == MSG_INPUT:
+                    _, client.last_input, bits = INPUT.unpack(body)
+                    client.player.inputs = unpack_inputs(bits)
+                elif body[0] == MSG_HELLO and self.profiles and client.player not in self.profiles.names:
+                    name = body[HELLO.size:].decode(errors="replace")
+                    # The lookup reads the file, so not on the game loop
+                    profile = await asyncio.get_running_loop().run_in_executor(None, self.profiles.store.load, name)
+                    if client in self.clients:
+                        self.profiles.join(client.player, name, profile)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.remove(client)
+            if self.profiles:
+                self.profiles.leave(client.player)
+            world.remove_player(client.player)
+            writer.close()
+
+    def tick(self):
+        world = self.world
+        if self.recorder:
+            self.recorder.record()
+        world.step()
+        if self.profiles:
+            self.profiles.update()
+
+        self.interest.begin_tick()
+        for client in self.clients:
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFERED:
+                # The view still holds what the client was last sent, so
+                # the next snapshot that goes out catches it up
+                client.skipped += 1
+                continue
+            entered, updated, left = self.interest.update(client.view)
+            changed = np.concatenate((entered, updated))
+            data = encode_snapshot(world.tick, client.last_input, left, self.interest.serialize(changed), len(changed))
+            client.writer.write(data)
+            self.bytes_sent += len(data)
+
+    async def run(self, report_every=1.0):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print("listening on %s:%d at %d Hz" % (self.host, self.port, self.rate))
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        next_tick = loop.time()
+        next_report = next_tick + report_every
+        async with server:
+            while True:
+                start = time.perf_counter()
+                self.tick()
+                self.tick_times.append((time.perf_counter() - start) * 1000)
+
+                now = loop.time()
+                if now >= next_report:
+                    self.report(now - next_report + report_every)
+                    next_report = now + report_every
+
+                next_tick += interval
+                if next_tick < now:
+                    # Too slow for the tick rate; don't try to catch up
+                    self.overruns += 1
+                    next_tick = now
+                await asyncio.sleep(next_tick - now)
+
+    def report(self, elapsed):
+        times = sorted(self.tick_times) or [0]
+        world = self.world
+        line = ("players %4d  mobs %4d  ticks %3d  tick p50 %6.2f  p95 %6.2f  max %6.2f ms  overruns %3d  "
+                "encoded %6d  out %7.1f KB/s  skipped %4d  rss %6.1f MB"
+                % (len(self.clients), len(world.mobs), len(self.tick_times), percentile(times, 50),
+                   percentile(times, 95), times[-1], self.overruns, self.interest.encoded,
+                   self.bytes_sent / 1024 / elapsed,
+                   sum(client.skipped for client in self.clients), rss_mb()))
+        line += "  mobs near %d far %d dormant %d" % (world.ai.near, world.ai.far, world.ai.dormant)
+        if world.spawner:
+            line += "  despawned %d" % world.spawner.despawned
+        if world.regions:
+            line += "  ghosts %d" % world.regions.ghosts
+        if self.profiles:
+            line += "  profiles saved %d in %d writes" % (self.profiles.store.written, self.profiles.store.batches)
+        print(line)
+        for client in self.clients:
+            client.skipped = 0
+        self.interest.encoded = 0
+        self.tick_times = []
+        self.overruns = 0
+        self.bytes_sent = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="florr.io clone game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--rate", type=int, default=30, help="ticks per second")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-mobs", type=int, default=MAX_MOBS)
+    parser.add_argument("--record", help="write a replay of the session to this .flrp file")
+    parser.add_argument("--workers", type=int, default=0, help="processes to split mob collisions over")
+    parser.add_argument("--profiles", help="keep player profiles in this SQLite file")
+    args = parser.parse_args()
+    server = GameServer(args.host, args.port, args.rate, args.seed, args.max_mobs, args.record, args.workers,
+                        args.profiles)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server.recorder:
+            server.recorder.close()
+        if server.profiles:
+            server.profiles.save_all()
+            server.profiles.store.close()
+        server.world.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import math
+from bisect import bisect_right
+
+
+class SpatialHash:
+    # Uniform grid keyed on a multiple of cell_size, rebuilt every tick.
+    # The cell is grown to fit the largest circle, so any two overlapping
+    # circles are always in the same or neighbouring cells.
+    def __init__(self, cell_size=50):
+        self.cell_size = cell_size
+        self.size = cell_size
+        self.cells = {}
+        self.keys = []          # Cell of each item
+        self.items = []
+        self.xs = []
+        self.ys = []
+        self.radii = []
+        self.max_radius = 0
+
+    def clear(self):
+        self.cells.clear()
+        self.keys = []
+        self.items = []
+        self.xs = []
+        self.ys = []
+        self.radii = []
+        self.max_radius = 0
+
+    def build(self, items, xs=None, ys=None, radii=None):
+        # Positions are read off the items unless passed in as lists
+        self.clear()
+        self.items = list(items)
+        self.xs = xs if xs is not None else [item.x for item in self.items]
+        self.ys = ys if ys is not None else [item.y for item in self.items]
+        self.radii = radii if radii is not None else [item.radius for item in self.items]
+
+        self.max_radius = max(self.radii, default=0)
+        self.size = self.cell_size * max(1, math.ceil(2 * self.max_radius / self.cell_size))
+
+        cells = self.cells
+        size = self.size
+        keys = self.keys
+        for i in range(len(self.items)):
+            key = (int(self.xs[i] // size), int(self.ys[i] // size))
+            keys.append(key)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [i]
+            else:
+                bucket.append(i)
+
+    def query_pairs(self):
+        # Index pairs (i, j), i < j, of items in the same or adjacent cells,
+        # in the same order a plain double loop over the items would visit
+        # them. Each cell's neighbours are gathered and sorted once, and
+        # every item takes the ones after it from there.
+        cells = self.cells
+        around = {}
+        pairs = []
+        for i, key in enumerate(self.keys):
+            near = around.get(key)
+            if near is None:
+                cx, cy = key
+                near = []
+                for nx in (cx - 1, cx, cx + 1):
+                    for ny in (cy - 1, cy, cy + 1):
+                        bucket = cells.get((nx, ny))
+                        if bucket is not None:
+                            near.extend(bucket)
+                near.sort()
+                around[key] = near
+            pairs.extend([(i, j) for j in near[bisect_right(near, i):]])
+        return pairs
+
+    def query_circle(self, x, y, r):
+        # Items whose circle overlaps the circle (x, y, r), in insertion order
+        size = self.size
+        reach = r + self.max_radius
+        cells = self.cells
+        xs, ys, radii = self.xs, self.ys, self.radii
+        found = []
+        for cx in range(int((x - reach) // size), int((x + reach) // size) + 1):
+            for cy in range(int((y - reach) // size), int((y + reach) // size) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    continue
+                for i in bucket:
+                    dx = xs[i] - x
+                    dy = ys[i] - y
+                    if (dx**2 + dy**2)**0.5 < r + radii[i]:
+                        found.append(i)
+        found.sort()
+        return [self.items[i] for i in found]
+
+    def query_segment(self, x0, y0, x1, y1, r):
+        # Items the circle of radius r touches on its way from (x0, y0) to
+        # (x1, y1), soonest first, ties in insertion order. Items are taken
+        # to stand still meanwhile.
+        size = self.size
+        reach = r + self.max_radius
+        cells = self.cells
+        xs, ys, radii = self.xs, self.ys, self.radii
+        sx = x1 - x0
+        sy = y1 - y0
+        a = sx * sx + sy * sy
+        found = []
+        for cx in range(int((min(x0, x1) - reach) // size), int((max(x0, x1) + reach) // size) + 1):
+            for cy in range(int((min(y0, y1) - reach) // size), int((max(y0, y1) + reach) // size) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    continue
+                for i in bucket:
+                    # First t in [0, 1] where |start + t*step - centre| = r + radius
+                    fx = x0 - xs[i]
+                    fy = y0 - ys[i]
+                    touch = r + radii[i]
+                    c = fx * fx + fy * fy - touch * touch
+                    if c < 0:
+                        found.append((0, i))   # Touching from the start
+                        continue
+                    if a == 0:
+                        continue
+                    b = fx * sx + fy * sy
+                    disc = b * b - a * c
+                    if b >= 0 or disc <= 0:
+                        continue               # Moving away, or passing wide
+                    t = (-b - disc**0.5) / a
+                    if t < 1:
+                        found.append((t, i))
+        found.sort()
+        return [self.items[i] for t, i in found]
@@ -0,0 +1,139 @@
+import bisect
+import heapq
+import json
+
+import numpy as np
+
+# Where and when mobs spawn, from a config file (spawns.json):
+#
+#   min_player_distance  never spawn a mob closer than this to a player
+#   despawn_distance     mobs this far from every player count as idle...
+#   despawn_idle         ...and go away after idling this many ticks
+#   zones                regions of the map, each with
+#       rect             [left, top, right, bottom]
+#       density          target mobs per 1000x1000 of the zone
+#       interval         average ticks between spawns while under target
+#       table            mob name -> weight
+#
+# Ticks here are at TICK_RATE; a World stepped at another rate scales
+# them.
+#
+# Instead of rolling a die for every zone every tick, each zone has the
+# tick of its next spawn on a heap, drawn once when the previous spawn
+# happens. Most ticks, nothing is due and update() returns straight away.
+
+CHECK_EVERY = 30        # Ticks between despawn checks
+
+
+class Zone:
+    __slots__ = ("name", "rect", "target", "interval", "specs", "weights", "total")
+
+    def __init__(self, name, rect, target, interval, table):
+        self.name = name
+        self.rect = tuple(rect)
+        self.target = target
+        self.interval = interval
+        self.specs = [spec for spec, weight in table]
+        self.weights = []           # Running totals, for bisect
+        self.total = 0
+        for spec, weight in table:
+            self.total += weight
+            self.weights.append(self.total)
+
+    def pick(self, rng):
+        return self.specs[bisect.bisect_right(self.weights, rng.random() * self.total)]
+
+    def count(self, mobs):
+        n = len(mobs)
+        left, top, right, bottom = self.rect
+        x, y = mobs.x[:n], mobs.y[:n]
+        return int(np.count_nonzero((x >= left) & (x < right) & (y >= top) & (y < bottom)))
+
+
+class Spawner:
+    def __init__(self, zones, min_player_distance=300, despawn_distance=1500, despawn_idle=1800):
+        self.zones = zones
+        self.min_player_distance = min_player_distance
+        self.despawn_distance = despawn_distance
+        self.despawn_idle = despawn_idle
+        self.due = []               # Heap of (tick, zone index)
+        self.despawned = 0
+
+    def specs(self):
+        # Every kind of mob that can spawn
+        return list({id(spec): spec for zone in self.zones for spec in zone.specs}.values())
+
+    def schedule(self, i, tick, rng, scale=1):
+        # Spawns are a Poisson process, interval ticks of TICK_RATE apart
+        # on average; scale is the World's
+        wait = max(1, round(rng.expovariate(scale / self.zones[i].interval)))
+        heapq.heappush(self.due, (tick + wait, i))
+
+    def update(self, world):
+        tick = world.tick
+        rng = world.random
+        if not self.due:
+            for i in range(len(self.zones)):
+                self.schedule(i, tick, rng, world.scale)
+
+        due = self.due
+        while due and due[0][0] <= tick:
+            _, i = heapq.heappop(due)
+            zone = self.zones[i]
+            if len(world.mobs) < world.max_mobs and zone.count(world.mobs) < zone.target:
+                self.spawn(world, zone)
+            self.schedule(i, tick, rng, world.scale)
+
+        if tick % CHECK_EVERY == 0:
+            self.despawn(world)
+
+    def spawn(self, world, zone, tries=8):
+        # Somewhere in the zone, away from every player; give up if the
+        # zone is crowded with players
+        rng = world.random
+        spec = zone.pick(rng)
+        left, top, right, bottom = zone.rect
+        reach = self.min_player_distance ** 2
+        players = [player.pos for player in world.players if not player.dead]
+        for _ in range(tries):
+            x = left + spec.radius + rng.random() * max(0, right - left - 2 * spec.radius)
+            y = top + spec.radius + rng.random() * max(0, bottom - top - 2 * spec.radius)
+            if all((x - px) ** 2 + (y - py) ** 2 >= reach for px, py in players):
+                return world.mobs.spawn(x, y, spec)
+        return None
+
+    def despawn(self, world):
+        # Mobs out of everyone's reach idle; calm ones that idled long
+        # enough go away
+        mobs = world.mobs
+        n = len(mobs)
+        if n == 0:
+            return
+        x, y = mobs.x[:n], mobs.y[:n]
+        near = np.zeros(n, dtype=bool)
+        reach = self.despawn_distance
+        for player in world.players:
+            if not player.dead:
+                px, py = player.pos
+                near |= (np.abs(x - px) < reach) & (np.abs(y - py) < reach)
+        idle = mobs.idle[:n]
+        idle[near] = 0
+        idle[~near] += CHECK_EVERY
+        gone = (idle >= self.despawn_idle / world.scale) & ~mobs.angry[:n]
+        if gone.any():
+            self.despawned += int(np.count_nonzero(gone))
+            mobs.remove(~gone)
+
+
+def load_spawner(path, mobs):
+    # mobs maps the names used in the config to MobSpecs
+    with open(path) as f:
+        config = json.load(f)
+    zones = []
+    for zone in config["zones"]:
+        left, top, right, bottom = zone["rect"]
+        target = round(zone["density"] * (right - left) * (bottom - top) / 1000000)
+        table = [(mobs[name], weight) for name, weight in zone["table"].items()]
+        zones.append(Zone(zone["name"], zone["rect"], target, zone["interval"], table))
+    return Spawner(zones, config.get("min_player_distance", 300), config.get("despawn_distance", 1500),
+                   config.get("despawn_idle", 1800))
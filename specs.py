@@ -0,0 +1,54 @@
+# What a kind of petal or mob *is*, shared by every instance of it. The
+# per-instance state (angle, timers, position, health) lives on Petal,
+# Drop and the MobPool rows instead.
+
+
+class PetalSpec:
+    __slots__ = ("name", "rarity_color", "color", "reload", "shootable", "pollen", "return_time", "damage", "radius")
+
+    def __init__(self, name, color=None, reload=20, shootable=False, pollen=False, ret_time=60, damage=10,
+                 rarity_color=(0, 255, 0), radius=10):
+        values = (name, rarity_color, color, reload, shootable, pollen, ret_time, damage, radius)
+        for slot, value in zip(self.__slots__, values):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PetalSpec is immutable")
+
+    def __reduce__(self):
+        return (PetalSpec, (self.name, self.color, self.reload, self.shootable, self.pollen, self.return_time,
+                            self.damage, self.rarity_color, self.radius))
+
+
+class MobSpec:
+    __slots__ = ("name", "radius", "texture", "health", "damage", "speed", "drops")
+
+    def __init__(self, name, size=15, texture=None, health=15, drops=(), damage=1, speed=5):
+        values = (name, size, texture, health, damage, speed, tuple(drops))
+        for slot, value in zip(self.__slots__, values):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MobSpec is immutable")
+
+    def __reduce__(self):
+        return (MobSpec, (self.name, self.radius, self.texture, self.health, self.drops, self.damage, self.speed))
+
+
+class Pool:
+    # Free list of objects to hand out again instead of allocating new ones
+    def __init__(self, factory):
+        self.factory = factory
+        self.free = []
+        self.created = 0
+        self.reused = 0
+
+    def get(self):
+        if self.free:
+            self.reused += 1
+            return self.free.pop()
+        self.created += 1
+        return self.factory()
+
+    def put(self, obj):
+        self.free.append(obj)
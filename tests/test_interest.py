@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+
+from interest import InterestManager, View
+from netproto import SnapshotDecoder, encode_snapshot, quantize, FRAME, POSITION_SCALE, KIND_MOB, KIND_DROP, KIND_PLAYER
+from world import World, Inputs, make_spawner, camera_origin
+
+WIDTH, HEIGHT = 800, 600
+ENTER, LEAVE = 100, 200
+
+
+def entities(world):
+    # (kind, id) -> position of everything a client could be told about
+    found = {(KIND_MOB, mob.id): (mob.x, mob.y) for mob in world.mobs}
+    found.update(((KIND_PLAYER, player.id), tuple(player.pos)) for player in world.players if not player.dead)
+    found.update(((KIND_DROP, drop.id), (drop.x, drop.y)) for drop in world.drops)
+    return found
+
+
+def test_deltas_keep_the_client_in_step():
+    # A client that only ever gets the deltas ends up knowing exactly
+    # what's in view, where it currently is
+    world = World(make_spawner(), seed=2, local_player=False, respawn=True, max_mobs=300)
+    player = world.add_player()
+    other = world.add_player()
+    rng = random.Random(2)
+    spec = world.spawner.specs()[0]
+    for _ in range(300):
+        world.mobs.spawn(rng.uniform(50, 1950), rng.uniform(50, 1950), spec)
+    interest = InterestManager(world, WIDTH, HEIGHT, ENTER, LEAVE)
+    view = View(player)
+    decoder = SnapshotDecoder()
+    for tick in range(600):
+        if tick % 40 == 0:
+            player.inputs = Inputs(*[rng.random() < 0.4 for _ in range(6)])
+            other.inputs = Inputs(*[rng.random() < 0.4 for _ in range(6)])
+        world.step()
+        interest.begin_tick()
+        entered, updated, left = interest.update(view)
+        changed = np.concatenate((entered, updated))
+        data = encode_snapshot(world.tick, 0, left, interest.serialize(changed), len(changed))
+        decoder.apply(data[FRAME.size:])
+
+        x, y = camera_origin(player.pos, WIDTH, HEIGHT, world.map_width, world.map_height)
+        known = decoder.entities
+        for key, (ex, ey) in entities(world).items():
+            if x - ENTER < ex < x + WIDTH + ENTER and y - ENTER < ey < y + HEIGHT + ENTER:
+                assert key in known
+            if key in known:
+                assert x - LEAVE < ex < x + WIDTH + LEAVE and y - LEAVE < ey < y + HEIGHT + LEAVE
+                entity = known[key]
+                assert (entity.x, entity.y) == (quantize(ex) / POSITION_SCALE, quantize(ey) / POSITION_SCALE)
+        assert set(known) <= set(entities(world))
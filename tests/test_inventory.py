@@ -0,0 +1,54 @@
+import random
+
+from inventory import Inventory, kind
+from specs import PetalSpec
+
+
+SPECS = [PetalSpec(name, rarity_color=color) for name in ("Basic", "Pollen", "Stinger")
+         for color in ((255, 255, 255), (255, 216, 0))]
+
+
+def scan(inventory, spec):
+    # find() the slow way: the first stack of the kind, else the first empty slot
+    slots = list(inventory)
+    for slot, stack in enumerate(slots):
+        if stack and kind(stack[0]) == kind(spec):
+            return slot
+    return slots.index(None) if None in slots else None
+
+
+def test_matches_scanning_the_slots():
+    rng = random.Random(0)
+    inventory = Inventory(20)
+    for _ in range(20000):
+        spec = rng.choice(SPECS)
+        slot = rng.randrange(len(inventory))
+        op = rng.random()
+        if op < 0.4:
+            expected = scan(inventory, spec)
+            assert inventory.add(spec) == expected
+        elif op < 0.7:
+            inventory.take(slot)
+        elif op < 0.9:
+            inventory.put(slot, spec)
+        else:
+            inventory[slot] = None
+        for spec in SPECS:
+            assert inventory.find(spec) == scan(inventory, spec)
+        kinds = {}
+        for slot, stack in enumerate(inventory):
+            if stack:
+                kinds.setdefault(kind(stack[0]), []).append(slot)
+        assert inventory.kinds == kinds
+
+
+def test_free_heap_stays_bounded():
+    rng = random.Random(1)
+    inventory = Inventory(20)
+    for _ in range(50000):
+        slot = rng.randrange(len(inventory))
+        if rng.random() < 0.5:
+            inventory.put(slot, rng.choice(SPECS))
+        else:
+            inventory.take(slot)
+    assert len(inventory.free) <= len(inventory)
@@ -0,0 +1,20 @@
+import numpy as np
+
+from mobpool import MobPool
+from world import make_spawner
+
+
+def test_update_matches_update_scalar():
+    specs = make_spawner().specs()
+    pools = [MobPool(2000, 2000, seed=1), MobPool(2000, 2000, seed=1)]
+    for pool in pools:
+        for i in range(200):
+            pool.spawn(i * 9.0, (i * 37) % 2000, specs[i % len(specs)])
+        pool.angry[:100:3] = True
+    vector, scalar = pools
+    positions = [[500.0, 500.0], [1500.0, 900.0]]
+    for _ in range(50):
+        vector.update(positions)
+        scalar.update_scalar(positions)
+    for name in MobPool.COLUMNS:
+        assert np.array_equal(getattr(vector, name)[:200], getattr(scalar, name)[:200]), name
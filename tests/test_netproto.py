@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+
+from netproto import (EntityEncoder, SnapshotDecoder, encode_snapshot, entity_key, pack_inputs, unpack_inputs,
+                      quantize, FRAME, KEYS, POSITION_SCALE, KIND_PLAYER, KIND_MOB, KIND_DROP)
+from world import World, Inputs, make_spawner
+
+
+def test_inputs_round_trip():
+    for keys in itertools.product((False, True), repeat=len(KEYS)):
+        inputs = unpack_inputs(pack_inputs(Inputs(*keys)))
+        assert tuple(getattr(inputs, key) for key in KEYS) == keys
+
+
+def test_snapshot_round_trip():
+    world = World(make_spawner(), seed=1)
+    spec = world.spawner.specs()[0]
+    for i in range(5):
+        world.mobs.spawn(100 + 37.3 * i, 200 + 11.6 * i, spec)
+    world.mobs.health[2] = spec.health / 2
+    drop = world.new_drop(321.7, 654.2, spec.drops[1])
+    player = world.player
+
+    encoder = EntityEncoder()
+    records = [encoder.mobs(world.mobs).tobytes(), encoder.player(player), encoder.drop(drop)]
+    data = encode_snapshot(7, 3, np.empty(0, dtype=np.int64), b"".join(records), len(world.mobs) + 2)
+    decoder = SnapshotDecoder()
+    assert decoder.apply(data[FRAME.size:]) == 7
+    assert decoder.last_input == 3
+
+    entities = decoder.entities
+    assert len(entities) == len(world.mobs) + 2
+    for mob in world.mobs:
+        entity = entities[(KIND_MOB, mob.id)]
+        assert entity.spec.name == spec.name
+        assert (entity.x, entity.y) == (quantize(mob.x) / POSITION_SCALE, quantize(mob.y) / POSITION_SCALE)
+    assert entities[(KIND_MOB, world.mobs[2].id)].health == 127 / 255
+    assert entities[(KIND_DROP, drop.id)].spec.name == drop.spec.name
+    petals = entities[(KIND_PLAYER, player.id)].petals
+    assert [petal[0].name for petal in petals] == [petal.name for petal in player.loadout if petal]
+
+    # Entities that left are dropped, the rest are kept
+    gone = world.mobs[0].id
+    data = encode_snapshot(8, 3, np.array([entity_key(KIND_MOB, gone)], dtype=np.int64), b"", 0)
+    decoder.apply(data[FRAME.size:])
+    assert (KIND_MOB, gone) not in decoder.entities
+    assert len(decoder.entities) == len(world.mobs) + 1
@@ -0,0 +1,55 @@
+import random
+
+import savefile
+from world import World, Inputs
+
+
+def play(world, rng, ticks, recorder=None):
+    for _ in range(ticks):
+        if world.tick % 30 == 0:
+            world.player.inputs = Inputs(*[rng.random() < 0.4 for _ in range(6)])
+        if world.tick % 200 == 0:
+            world.unequip(world.player, 3)
+        if world.tick % 200 == 50:
+            world.equip(world.player, 3, world.spawner.specs()[1].drops[2])
+        if recorder:
+            recorder.record()
+        world.step()
+
+
+def test_resume_and_replay_match(tmp_path):
+    save_path = str(tmp_path / "a.flws")
+    replay_path = str(tmp_path / "a.flrp")
+    world = World(seed=3)
+    play(world, random.Random(1), 300)
+    savefile.save(world, save_path)
+
+    rng = random.Random(2)
+    state = rng.getstate()
+    recorder = savefile.Recorder(world, replay_path)
+    play(world, rng, 1000, recorder)
+    recorder.close()
+    final = savefile.save_bytes(world)
+
+    rng.setstate(state)
+    resumed = savefile.load(save_path)
+    play(resumed, rng, 1000)
+    assert savefile.save_bytes(resumed) == final
+
+    replay = savefile.Replay(replay_path)
+    while not replay.done():
+        replay.step()
+    assert savefile.save_bytes(replay.world) == final
+
+
+def test_tick_rate_is_saved(tmp_path):
+    path = str(tmp_path / "b.flws")
+    world = World(seed=4, rate=30)
+    for _ in range(100):
+        world.step()
+    savefile.save(world, path)
+    loaded = savefile.load(path)
+    assert loaded.rate == 30
+    world.step()
+    loaded.step()
+    assert savefile.save_bytes(loaded) == savefile.save_bytes(world)
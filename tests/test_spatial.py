@@ -0,0 +1,57 @@
+import math
+import random
+
+from mobpool import separate
+from spatial import SpatialHash
+
+
+class Item:
+    def __init__(self, x, y, radius):
+        self.x = x
+        self.y = y
+        self.radius = radius
+
+
+def sweep(items, x0, y0, x1, y1, r, steps=2000):
+    # Items touched by the circle at any of steps points along the segment,
+    # in the order they're first touched
+    found = []
+    for item in items:
+        for k in range(steps + 1):
+            t = k / steps
+            if math.hypot(x0 + t * (x1 - x0) - item.x, y0 + t * (y1 - y0) - item.y) < r + item.radius:
+                found.append((t, item))
+                break
+    return [item for t, item in sorted(found, key=lambda found: found[0])]
+
+
+def test_query_segment_matches_sampling():
+    rng = random.Random(0)
+    for _ in range(200):
+        items = [Item(rng.uniform(0, 500), rng.uniform(0, 500), rng.uniform(3, 30)) for _ in range(30)]
+        grid = SpatialHash(50)
+        grid.build(items)
+        x0, y0 = rng.uniform(0, 500), rng.uniform(0, 500)
+        x1, y1 = x0 + rng.uniform(-80, 80), y0 + rng.uniform(-80, 80)
+        r = rng.uniform(2, 15)
+        # Sampling can miss a graze, so only the sets have to agree
+        assert set(map(id, grid.query_segment(x0, y0, x1, y1, r))) == set(map(id, sweep(items, x0, y0, x1, y1, r)))
+        assert grid.query_segment(x0, y0, x0, y0, r) == grid.query_circle(x0, y0, r)
+
+
+def test_query_pairs_separate_like_a_double_loop():
+    rng = random.Random(1)
+    n = 100
+    mobs = [[rng.uniform(0, 600), rng.uniform(0, 600), rng.uniform(-3, 3), rng.uniform(-3, 3)] for _ in range(n)]
+    radii = [rng.uniform(10, 30) for _ in range(n)]
+    grid = SpatialHash(50)
+    grid.build(range(n), [mob[0] for mob in mobs], [mob[1] for mob in mobs], radii)
+    pairs = grid.query_pairs()
+    assert pairs == sorted(pairs)
+
+    results = []
+    for pairs in (pairs, [(i, j) for i in range(n) for j in range(i + 1, n)]):
+        xs, ys, dxs, dys = [[mob[k] for mob in mobs] for k in range(4)]
+        separate(xs, ys, dxs, dys, radii, pairs)
+        results.append((xs, ys, dxs, dys))
+    assert results[0] == results[1]
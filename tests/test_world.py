@@ -0,0 +1,35 @@
+import random
+
+from world import World, make_spawner
+
+
+def contact_damage(rate, seed, seconds=20):
+    # Health a player standing still loses to five angry bees
+    world = World(seed=seed, rate=rate, loadout=[None] * 8)
+    world.spawner = None
+    player = world.player
+    player.health = player.max_health = 10**9
+    spec = make_spawner().specs()[0]
+    rng = random.Random(seed)
+    for _ in range(5):
+        world.mobs.spawn(1000 + rng.uniform(-150, 150), 1000 + rng.uniform(-150, 150), spec)
+    world.mobs.angry[:5] = True
+    for _ in range(seconds * rate):
+        world.step()
+    return player.max_health - player.health
+
+
+def test_contact_damage_does_not_depend_on_tick_rate():
+    fast = sum(contact_damage(60, seed) for seed in range(10))
+    slow = sum(contact_damage(30, seed) for seed in range(10))
+    assert 0.75 < slow / fast < 1.33
+
+
+def test_player_speed_does_not_depend_on_tick_rate():
+    for rate in (30, 60, 120):
+        world = World(seed=1, rate=rate)
+        world.spawner = None
+        world.player.inputs.right = True
+        for _ in range(rate):
+            world.step()
+        assert world.player.pos[0] == world.map_width // 2 + 300
@@ -0,0 +1,549 @@
+import math
+import os
+import random
+
+import numpy as np
+
+from spatial import SpatialHash
+from mobpool import MobPool
+from mobai import MobAI
+from specs import PetalSpec, MobSpec, Pool
+from inventory import Inventory
+from spawning import load_spawner
+from regions import RegionPool
+from events import EventBus, HitBuffer, MOB_HITS, PLAYER_HITS
+from profiler import Profiler
+
+# The simulation side of the game. Nothing in here touches pygame, so a
+# World can be stepped headless, as fast as the CPU allows.
+
+# Every speed, timer and spawn interval in here counts ticks, tuned for
+# this many ticks per second. A World built for another rate scales them
+# by TICK_RATE / rate, so the game plays the same in seconds.
+TICK_RATE = 60
+
+# Map variables
+MAP_WIDTH = 2000
+MAP_HEIGHT = 2000
+TILE_SIZE = 50
+
+# Inventory variables
+INVENTORY_ROWS = 5
+INVENTORY_COLS = 4
+
+# Player settings
+PLAYER_SPEED = 5
+PLAYER_RADIUS = 20
+PLAYER_MAX_HEALTH = 1000
+
+# Petal settings
+PETAL_COUNT = 8
+PETAL_SIZE = 10
+PETAL_SPEED = 2         # Degrees per tick
+
+DROP_TIME = 600         # Ticks a drop lies on the floor
+KNOCKBACK = 10          # Knockback speed
+KNOCKBACK_TIME = 15     # and ticks
+
+MAX_MOBS = 100
+SPAWN_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spawns.json")
+
+
+def camera_origin(player_pos, width, height, map_width, map_height):
+    # Top left of a width x height camera centred on the player
+    camera_x = player_pos[0] - width // 2
+    camera_y = player_pos[1] - height // 2
+
+    # Clamp so camera never shows outside map bounds
+    if camera_x < 0:
+        camera_x = 0
+    if camera_y < 0:
+        camera_y = 0
+    if camera_x > map_width - width:
+        camera_x = map_width - width
+    if camera_y > map_height - height:
+        camera_y = map_height - height
+    return camera_x, camera_y
+
+
+def _spec_field(name):
+    return property(lambda self: getattr(self.spec, name))
+
+
+class Petal:
+    # A petal in the loadout: a PetalSpec plus where it is and what it's doing
+    __slots__ = ("spec", "angle", "state", "x", "y", "dx", "dy", "speed", "return_timer", "reload_timer")
+
+    name = _spec_field("name")
+    rarity_color = _spec_field("rarity_color")
+    color = _spec_field("color")            # Texture, None when headless
+    reload = _spec_field("reload")
+    shootable = _spec_field("shootable")    # Shootable?
+    pollen = _spec_field("pollen")
+    return_time = _spec_field("return_time")
+    damage = _spec_field("damage")
+    radius = _spec_field("radius")          # Hitbox size
+
+    def __init__(self, spec=None, angle=0):
+        self.reset(spec, angle)
+
+    def reset(self, spec, angle):
+        self.spec = spec
+        self.angle = angle           # Angle in degrees
+        self.state = "orbiting"      # "orbiting" or "shot"
+        self.x = 0
+        self.y = 0
+        self.dx = 0
+        self.dy = 0
+        self.speed = 10              # Speed when shot
+        self.return_timer = 0        # Ticks before returning
+        self.reload_timer = 0        # Ticks before it can reappear
+        return self
+
+    def update(self, player_pos, orbit_radius, scale=1):
+        # Rotate. scale is the World's, ticks of TICK_RATE per tick.
+        self.angle = (self.angle + PETAL_SPEED * scale) % 360
+        if self.state == "orbiting":
+            # Orbit around player
+            rad = math.radians(self.angle)
+            self.x = player_pos[0] + orbit_radius * math.cos(rad)
+            self.y = player_pos[1] + orbit_radius * math.sin(rad)
+        elif self.state == "shot":
+            # Move outward in the set direction
+            if self.pollen:
+                self.dx *= 0.9 ** scale
+                self.dy *= 0.9 ** scale
+            self.x += self.dx
+            self.y += self.dy
+            self.return_timer -= 1
+            if self.return_timer <= 0:
+                self.state = "orbiting"
+        elif self.state == "reloading":
+            rad = math.radians(self.angle)
+            self.x = player_pos[0] + orbit_radius * math.cos(rad)
+            self.y = player_pos[1] + orbit_radius * math.sin(rad)
+            self.reload_timer -= 1
+            if self.reload_timer <= 0:
+                self.state = "orbiting"
+
+    def shoot(self, player_pos, scale=1):
+        if self.state == "orbiting":
+            self.state = "shot"
+            # Calculate direction outwards from player
+            angle = math.atan2(self.y - player_pos[1], self.x - player_pos[0])
+            self.dx = math.cos(angle) * self.speed * scale
+            self.dy = math.sin(angle) * self.speed * scale
+            self.return_timer = round(self.return_time / scale)  # Ticks before returning to orbit
+
+    def hit_mob(self, scale=1):
+        self.state = "reloading"
+        self.reload_timer = round(self.reload / scale)  # Number of ticks petal disappears
+
+
+class Drop:
+    # A petal lying on the floor
+    __slots__ = ("id", "x", "y", "radius", "spec", "timer")
+
+    def __init__(self, x=0, y=0, spec=None, id=0):
+        self.reset(x, y, spec, id)
+
+    def reset(self, x, y, spec, id=0, timer=DROP_TIME):
+        self.id = id
+        self.x = x
+        self.y = y
+        self.radius = 10
+        self.spec = spec
+        self.timer = timer
+        return self
+
+
+def make_specs(images={}):
+    # Every kind of petal and mob. images maps names to textures, anything
+    # missing is None (fine headless).
+    pollen_image = images.get("pollen")
+    stinger_image = images.get("stinger")
+    missile_image = images.get("missile")
+
+    petals = {
+        "basic": PetalSpec("Basic", images.get("basic"), 75),
+
+        "cpollen": PetalSpec("Pollen", pollen_image, 30, True, True, 150, 19),
+        "cstinger": PetalSpec("Stinger", stinger_image, 300, damage = 100),
+        "cmissile": PetalSpec("Missile", missile_image, 45, True, damage = 25),
+
+        "upollen": PetalSpec("Pollen", pollen_image, 30, True, True, 150, 57, (255, 216, 0)),
+        "ustinger": PetalSpec("Stinger", stinger_image, 300, damage = 300, rarity_color=(255, 216, 0)),
+        "umissile": PetalSpec("Missile", missile_image, 45, True, damage = 75, rarity_color=(255, 216, 0)),
+    }
+    # The old spawn templates said damage = 50 / 150, but spawning never
+    # copied it over, so bees have always hit for the default 1
+    mobs = {
+        "cbee": MobSpec("Bee", 40, images.get("common_bee"), 37,
+                        [petals["cpollen"], petals["cstinger"], petals["cmissile"]], damage = 1),
+        "ubee": MobSpec("Bee", 60, images.get("unusual_bee"), 140,
+                        [petals["upollen"], petals["ustinger"], petals["umissile"]], damage = 1),
+    }
+    return petals, mobs
+
+
+def make_spawner(images={}, path=SPAWN_CONFIG):
+    petals, mobs = make_specs(images)
+    return load_spawner(path, mobs)
+
+
+def make_loadout(images={}):
+    basic = make_specs(images)[0]["basic"]
+    return [Petal(basic, i * (360 // PETAL_COUNT)) for i in range(PETAL_COUNT)]
+
+
+class Inputs:
+    # One tick worth of player input
+    def __init__(self, up=False, down=False, left=False, right=False, extend=False, recall=False):
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+        self.extend = extend    # SPACE: push petals out and shoot
+        self.recall = recall    # LSHIFT: call shot petals back
+
+
+class Player:
+    # One flower: where it is, how healthy, and the petals it carries
+    def __init__(self, id, x, y, loadout=None):
+        self.id = id
+        self.pos = [x, y]
+        self.health = PLAYER_MAX_HEALTH
+        self.max_health = PLAYER_MAX_HEALTH
+        self.knockback_dx = 0
+        self.knockback_dy = 0
+        self.knockback_timer = 0
+
+        self.petal_offset = 0
+        self.petal_radius = 50       # Distance from player
+
+        self.inventory = Inventory(INVENTORY_ROWS * INVENTORY_COLS)
+        self.loadout = loadout if loadout is not None else make_loadout()
+        self.inputs = Inputs()       # Held keys, until new ones arrive
+        self.dead = False
+
+
+class World:
+    # Mobs, drops and the spawner, shared by every player in self.players.
+    # self.player is the local one, None on a server. With respawn set,
+    # dead players come back in the center instead of ending the game.
+    # With workers, mob collisions are split over that many processes.
+    # rate is how many times a second it will be stepped.
+    def __init__(self, spawner=None, loadout=None, seed=None,
+                 map_width=MAP_WIDTH, map_height=MAP_HEIGHT, max_mobs=MAX_MOBS, profiler=None, local_player=True,
+                 respawn=False, workers=0, rate=TICK_RATE):
+        self.rate = rate
+        self.scale = TICK_RATE / rate   # Ticks of TICK_RATE per tick
+        self.player_speed = PLAYER_SPEED * self.scale
+        self.drop_time = round(DROP_TIME / self.scale)
+        self.knockback_time = max(1, round(KNOCKBACK_TIME / self.scale))
+        self.knockback = KNOCKBACK * KNOCKBACK_TIME / self.knockback_time    # Same distance in the end
+        self.map_width = map_width
+        self.map_height = map_height
+        self.max_mobs = max_mobs
+        self.respawn_players = respawn
+        self.random = random.Random(seed)
+        self.next_id = 1            # Players and drops
+
+        self.players = []
+        self.player = self.add_player(loadout) if local_player else None
+
+        self.spawner = spawner if spawner is not None else make_spawner()
+        self.mobs = MobPool(map_width, map_height, seed=seed, scale=self.scale)
+        self.ai = MobAI(map_width, map_height, scale=self.scale)
+        self.drops = []
+        self.petal_pool = Pool(Petal)
+        self.drop_pool = Pool(Drop)
+        self.mob_grid = SpatialHash(TILE_SIZE)
+        self.drop_grid = SpatialHash(TILE_SIZE)
+        self.regions = RegionPool(workers, TILE_SIZE) if workers else None
+        self.events = EventBus()
+        self.mob_hits = HitBuffer()
+        self.player_hits = HitBuffer()
+
+        self.tick = 0
+        self.game_over = False
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.equips = None          # (player, slot, spec or None) per loadout change, while a Recorder wants them
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def add_player(self, loadout=None):
+        player = Player(self.new_id(), self.map_width // 2, self.map_height // 2, loadout)  # Starting in the center
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player):
+        self.players.remove(player)
+        for petal in player.loadout:
+            if petal:
+                self.free_petal(petal)
+
+    def respawn(self, player):
+        player.pos[:] = [self.map_width // 2, self.map_height // 2]
+        player.health = player.max_health
+        player.knockback_timer = 0
+        player.dead = False
+
+    def step(self, inputs=None):
+        # inputs are the local player's; everyone else's are already on player.inputs
+        mark = self.profiler.mark
+        self.tick += 1
+        if inputs is not None:
+            self.player.inputs = inputs
+        players = [player for player in self.players if not player.dead]
+        for player in players:
+            self.move_player(player)
+        mark("player")
+        for player in players:
+            self.update_petals(player)
+        mark("petals")
+        self.spawn_mobs()
+        mark("spawn")
+        self.update_mobs(players)
+        self.update_drops(players)
+        mark("drops")
+
+        if self.respawn_players:
+            for player in self.players:
+                if player.dead:
+                    self.respawn(player)
+
+    def move_player(self, player):
+        inputs = player.inputs
+        player_pos = player.pos
+        if player.knockback_timer > 0:
+            player_pos[0] += player.knockback_dx
+            player_pos[1] += player.knockback_dy
+            player.knockback_timer -= 1
+        else:
+            # Normal WASD movement
+            if inputs.up:
+                player_pos[1] -= self.player_speed
+            if inputs.down:
+                player_pos[1] += self.player_speed
+            if inputs.left:
+                player_pos[0] -= self.player_speed
+            if inputs.right:
+                player_pos[0] += self.player_speed
+
+        # Keep player inside map boundaries
+        player_pos[0] = max(PLAYER_RADIUS, min(self.map_width - PLAYER_RADIUS, player_pos[0]))
+        player_pos[1] = max(PLAYER_RADIUS, min(self.map_height - PLAYER_RADIUS, player_pos[1]))
+
+    def update_petals(self, player):
+        inputs = player.inputs
+        if inputs.extend:
+            player.petal_radius = 100
+            for petal in player.loadout:
+                if petal and petal.shootable and petal.state == "orbiting":
+                    petal.shoot(player.pos, self.scale)
+        else:
+            player.petal_radius = 50
+
+        if inputs.recall:
+            for petal in player.loadout:
+                if petal and petal.shootable and petal.state == "shot":
+                    petal.return_timer = 0
+
+        player.petal_offset += PETAL_SPEED * self.scale
+        for petal in player.loadout:
+            if petal:
+                petal.update(player.pos, player.petal_radius, self.scale)
+
+    def spawn_mobs(self):
+        if self.spawner:
+            self.spawner.update(self)
+
+    def update_mobs(self, players):
+        mobs = self.mobs
+        mark = self.profiler.mark
+        # Angry mobs go for the nearest player. Mobs far from every player
+        # steer less often, and dormant ones don't move at all.
+        rows, think = self.ai.plan(mobs, players, self.tick)
+        mobs.update([player.pos for player in players], rows, think)
+        mark("mobs")
+        if self.regions:
+            # The workers do mob vs mob, so only mobs players can reach
+            # need to be in the grid
+            mobs.build_grid(self.mob_grid, self.reachable(players))
+        else:
+            mobs.build_grid(self.mob_grid, rows)
+
+        # Petals hit at most one mob each, and only live mobs. Hits are
+        # only recorded here; resolve_combat() applies them.
+        hits, bumps = self.mob_hits, self.player_hits
+        hits.clear()
+        bumps.clear()
+        left = {}       # Mob row -> health once this tick's hits so far land
+        for p, player in enumerate(players):
+            for petal in player.loadout:
+                if not petal or petal.state == "reloading":
+                    continue
+                if petal.state == "shot":
+                    # Swept along this tick's step, so a fast petal can't
+                    # jump over a small mob
+                    found = self.mob_grid.query_segment(petal.x - petal.dx, petal.y - petal.dy,
+                                                        petal.x, petal.y, petal.radius)
+                else:
+                    found = self.mob_grid.query_circle(petal.x, petal.y, petal.radius)
+                for mob in found:
+                    i = mob.index
+                    health = left.get(i)
+                    if health is None:
+                        health = mob.health
+                    if health <= 0:
+                        continue
+                    health -= petal.damage
+                    left[i] = health
+                    hits.add(p, i, petal.damage, health <= 0)
+                    petal.hit_mob(self.scale)
+                    break
+
+        # Player body vs mobs, once per mob
+        for p, player in enumerate(players):
+            player_pos = player.pos
+            for mob in self.mob_grid.query_circle(player_pos[0], player_pos[1], PLAYER_RADIUS):
+                if left.get(mob.index, 1) <= 0:
+                    continue
+                bumps.add(p, mob.index, mob.damage * self.scale)     # Damage is per tick of contact
+
+        mark("hits")
+        self.resolve_combat(players)
+
+        # Handle collisions between mobs
+        if self.regions:
+            self.regions.separate(mobs, rows)
+        else:
+            mobs.separate(self.mob_grid.query_pairs(), rows)
+
+        # Mobs die
+        if hits.count:
+            mobs.swap_remove(hits.mob[:hits.count][hits.killed[:hits.count]])
+        mark("mob_collisions")
+
+    def resolve_combat(self, players):
+        # The tick's hits, all at once: damage adds up per mob and player,
+        # each dead mob leaves one drop, and the last mob to run into a
+        # player knocks it back. Dead mobs keep their rows until
+        # update_mobs() removes them, so listeners can still read them.
+        mobs = self.mobs
+        hits, bumps = self.mob_hits, self.player_hits
+        hits.players = bumps.players = players
+        n = hits.count
+        if n:
+            rows = hits.mob[:n]
+            np.subtract.at(mobs.health, rows, hits.damage[:n])
+            mobs.angry[rows] = True
+            hits.mob_id[:n] = mobs.id[rows]
+            # Drops, in the order the mobs died
+            drops = []
+            for i in rows[hits.killed[:n]].tolist():
+                mob = mobs[i]
+                spec = self.random.choice(mob.drops)
+                x = mob.x + 40 * (self.random.random() - 0.5)
+                y = mob.y + 40 * (self.random.random() - 0.5)
+                drops.append(self.drop_pool.get().reset(x, y, spec, self.new_id(), self.drop_time))
+            self.drops.extend(drops)
+            self.events.publish(MOB_HITS, self, hits)
+
+        n = bumps.count
+        if n:
+            hits_by = np.bincount(bumps.player[:n], weights=bumps.damage[:n], minlength=len(players))
+            last = dict(zip(bumps.player[:n].tolist(), bumps.mob[:n].tolist()))
+            bumps.mob_id[:n] = mobs.id[bumps.mob[:n]]
+            for p, i in last.items():
+                player = players[p]
+                player.health -= hits_by[p].item()    # Damage player
+                if player.health <= 0:
+                    player.dead = True
+                    if player is self.player:
+                        self.game_over = True
+                dx = mobs.x[i].item() - player.pos[0]
+                dy = mobs.y[i].item() - player.pos[1]
+                dist = max(1, (dx**2 + dy**2)**0.5)
+                player.knockback_dx = -(dx / dist) * self.knockback
+                player.knockback_dy = -(dy / dist) * self.knockback
+                player.knockback_timer = self.knockback_time
+            self.events.publish(PLAYER_HITS, self, bumps)
+
+    def reachable(self, players):
+        # Rows of mobs that might touch a player or one of its petals,
+        # going by a box around each player and its petals
+        mobs = self.mobs
+        n = len(mobs)
+        x, y = mobs.x[:n], mobs.y[:n]
+        near = np.zeros(n, dtype=bool)
+        margin = float(mobs.radius[:n].max(initial=0))
+        for player in players:
+            px, py = player.pos
+            left, top, right, bottom = px - PLAYER_RADIUS, py - PLAYER_RADIUS, px + PLAYER_RADIUS, py + PLAYER_RADIUS
+            for petal in player.loadout:
+                if petal and petal.state != "reloading":
+                    # Shot petals sweep from where they were last tick
+                    x0, y0 = (petal.x - petal.dx, petal.y - petal.dy) if petal.state == "shot" else (petal.x, petal.y)
+                    left = min(left, petal.x - petal.radius, x0 - petal.radius)
+                    top = min(top, petal.y - petal.radius, y0 - petal.radius)
+                    right = max(right, petal.x + petal.radius, x0 + petal.radius)
+                    bottom = max(bottom, petal.y + petal.radius, y0 + petal.radius)
+            near |= (x > left - margin) & (x < right + margin) & (y > top - margin) & (y < bottom + margin)
+        return np.flatnonzero(near)
+
+    def close(self):
+        if self.regions:
+            self.regions.close()
+
+    def update_drops(self, players):
+        live_drops = []
+        for drop in self.drops:
+            drop.timer -= 1
+            if drop.timer < 0:
+                self.drop_pool.put(drop)
+                continue
+            live_drops.append(drop)
+        self.drops[:] = live_drops
+
+        self.drop_grid.build(self.drops)
+        taken = set()
+        for player in players:
+            for drop in self.drop_grid.query_circle(player.pos[0], player.pos[1], PLAYER_RADIUS):
+                if drop in taken:
+                    continue
+                # Collect the drop
+                taken.add(drop)
+                self.drops.remove(drop)
+                self.collect(player, drop.spec)
+                self.drop_pool.put(drop)
+
+    def collect(self, player, spec):
+        # Onto the petal's stack or into the first empty slot; lost if full
+        player.inventory.add(spec)
+
+    def new_drop(self, x, y, spec):
+        drop = self.drop_pool.get().reset(x, y, spec, self.new_id(), self.drop_time)
+        self.drops.append(drop)
+        return drop
+
+    def equip(self, player, slot, spec):
+        # A new petal of kind spec in an empty loadout slot, in step with the rest
+        player.loadout[slot] = self.new_petal(spec, slot * (360 // PETAL_COUNT) + player.petal_offset)
+        if self.equips is not None:
+            self.equips.append((player, slot, spec))
+
+    def unequip(self, player, slot):
+        self.free_petal(player.loadout[slot])
+        player.loadout[slot] = None
+        if self.equips is not None:
+            self.equips.append((player, slot, None))
+
+    def new_petal(self, spec, angle):
+        return self.petal_pool.get().reset(spec, angle)
+
+    def free_petal(self, petal):
+        self.petal_pool.put(petal)